@@ -0,0 +1,143 @@
+"""
+Headless batch mode: solves every antibody panel against every instrument
+and writes one result file per (panel, instrument) job, plus a summary.
+
+    python AbWizard/batch.py --panels panels/ --instruments cytometers/ --output results/ --workers 4
+"""
+import argparse
+import csv
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from loaders import INSTRUMENT_EXTENSIONS, PANEL_EXTENSIONS, list_definitions, load_instrument, load_panel
+from wizard import Wizard
+
+logger = logging.getLogger(__name__)
+
+MODES = ('witness', 'all', 'slots', 'top', 'optimal')
+OUTPUT_FORMATS = ('csv', 'parquet', 'feather')
+SUMMARY_HEADERS = ['Job', 'Panel', 'Instrument', 'Max_Markers', 'Panels_Written', 'Seconds', 'Status', 'Output']
+
+
+def file_labels(paths):
+    """Names each file by its stem, keeping the extension when two files share a stem."""
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    return {
+        path: stem if stems.count(stem) == 1 else os.path.basename(path).replace('.', '_')
+        for path, stem in zip(paths, stems)
+    }
+
+
+def run_job(job):
+    """Solves one (panel, instrument) pair and returns its summary row; errors are reported, not raised."""
+    name, panel_path, instrument_path, output_path, mode, top_k, use_cache, excitation_tolerance = job
+    start = time.monotonic()
+    max_markers, panels_written, status = 0, 0, 'ok'
+    try:
+        wizard = Wizard(load_panel(panel_path), load_instrument(instrument_path), excitation_tolerance)
+        # The output file holds the panels; the summary only needs their counts
+        results = wizard.run(
+            enumerate_all=mode in ('all', 'slots', 'top'), output_path=output_path,
+            top_k=top_k if mode == 'top' else None, optimize=mode == 'optimal', expand=mode != 'slots',
+            use_cache=use_cache, keep_results=False
+        )
+        if results:
+            max_markers = len(results[0]['markers_used'])
+            if mode == 'all':
+                panels_written = sum(package['num_solutions'] for package in results)
+            elif mode == 'slots':
+                # Rows of the file are slot-level panels, each standing for several full ones
+                panels_written = sum(package['num_slot_panels'] for package in results)
+            elif mode == 'witness':
+                panels_written = 1
+            else:
+                panels_written = len(results)
+        else:
+            status = 'no solution'
+    except Exception as e:
+        logger.error(f"{name}: {e}")
+        status = f"error: {e}"
+    return {
+        'Job': name, 'Panel': panel_path, 'Instrument': instrument_path,
+        'Max_Markers': max_markers, 'Panels_Written': panels_written,
+        'Seconds': round(time.monotonic() - start, 3), 'Status': status,
+        'Output': output_path if panels_written else '',
+    }
+
+
+def build_jobs(panel_paths, instrument_paths, output_dir, mode, top_k, output_format, use_cache=True,
+               excitation_tolerance=None):
+    """One job per (panel, instrument) pair, writing to `<panel>__<instrument>.<format>`."""
+    panel_labels = file_labels(panel_paths)
+    instrument_labels = file_labels(instrument_paths)
+    jobs = []
+    for panel_path in panel_paths:
+        for instrument_path in instrument_paths:
+            name = f"{panel_labels[panel_path]}__{instrument_labels[instrument_path]}"
+            output_path = os.path.join(output_dir, f"{name}.{output_format}")
+            jobs.append((name, panel_path, instrument_path, output_path, mode, top_k, use_cache, excitation_tolerance))
+    return jobs
+
+
+def run_batch(jobs, workers=None):
+    """Runs the jobs in this process, or on `workers` processes; summary rows come back in job order."""
+    if workers is not None and workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(run_job, jobs))
+    return [run_job(job) for job in jobs]
+
+
+def write_summary(rows, path):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_HEADERS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--panels', required=True, help="panel file, or directory of panel .json/.csv files")
+    parser.add_argument('--instruments', required=True, help="instrument file, or directory of instrument .json/.csv files")
+    parser.add_argument('--output', required=True, help="directory for the per-job results and summary.csv")
+    parser.add_argument('--mode', choices=MODES, default='witness',
+                        help="witness: one maximum panel; all: every maximum panel; slots: every maximum panel, "
+                             "interchangeable antibodies on one row (csv only); "
+                             "top: the --top-k least-spillover panels; optimal: the least-spillover panel")
+    parser.add_argument('--top-k', type=int, default=100)
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='csv')
+    parser.add_argument('--excitation-tolerance', type=float, default=None,
+                        help=f"nm between an antibody's excitation peak and a laser (default {Wizard.EXCITATION_TOLERANCE})")
+    parser.add_argument('--workers', type=int, default=None, help="solve jobs on this many processes")
+    parser.add_argument('--no-cache', action='store_true', help="solve every job even if its results are cached")
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    args = parser.parse_args(argv)
+    if args.mode == 'slots' and args.format != 'csv':
+        parser.error("--mode slots can only be written as csv")
+
+    logging.basicConfig(level=getattr(logging, args.log_level), format='%(message)s')
+
+    panel_paths = list_definitions(args.panels, PANEL_EXTENSIONS)
+    instrument_paths = list_definitions(args.instruments, INSTRUMENT_EXTENSIONS)
+    if not panel_paths or not instrument_paths:
+        parser.error("no panel or instrument definitions found")
+    os.makedirs(args.output, exist_ok=True)
+
+    jobs = build_jobs(
+        panel_paths, instrument_paths, args.output, args.mode, args.top_k, args.format, not args.no_cache,
+        args.excitation_tolerance
+    )
+    logger.info(f"Running {len(jobs)} job(s): {len(panel_paths)} panel(s) x {len(instrument_paths)} instrument(s)")
+    rows = run_batch(jobs, args.workers)
+
+    summary_path = os.path.join(args.output, 'summary.csv')
+    write_summary(rows, summary_path)
+    failed = [row for row in rows if row['Status'].startswith('error')]
+    logger.info(f"Summary saved to {summary_path} ({len(failed)} job(s) failed)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
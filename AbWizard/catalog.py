@@ -0,0 +1,156 @@
+"""
+Compact memory-mapped antibody catalogs.
+
+    python AbWizard/catalog.py import vendor.csv vendor.abcat
+    python AbWizard/catalog.py export vendor.abcat vendor.json
+"""
+import argparse
+import json
+import mmap
+import struct
+import sys
+
+import numpy as np
+
+from loaders import load_panel, save_panel
+
+MAGIC = b'ABCAT01\n'
+# Array payloads start on this byte boundary so they can be viewed in place
+ALIGNMENT = 64
+
+
+# ------------------------------------------------------------------- #
+# Columnar catalog file
+# ------------------------------------------------------------------- #
+# File layout: MAGIC, a little-endian uint64 header length, a JSON header
+# (marker names plus the dtype/offset/length of every array), then the
+# arrays. Records are grouped by marker: the antibodies of marker i are
+# rows marker_offsets[i]:marker_offsets[i + 1] of `ex`, `em` and the names,
+# which are one UTF-8 blob cut by `name_offsets`.
+
+def write_catalog(panel, path):
+    """Writes a {marker: [{'name', 'ex', 'em'}, ...]} panel to a catalog file."""
+    markers = list(panel.keys())
+    records = [ab for marker in markers for ab in panel[marker]]
+    names = [ab['name'].encode('utf-8') for ab in records]
+    arrays = {
+        'marker_offsets': np.cumsum([0] + [len(panel[m]) for m in markers], dtype=np.int64),
+        'ex': np.array([ab['ex'] for ab in records], dtype=np.float64),
+        'em': np.array([ab['em'] for ab in records], dtype=np.float64),
+        'name_offsets': np.cumsum([0] + [len(name) for name in names], dtype=np.int64),
+        'name_blob': np.frombuffer(b''.join(names), dtype=np.uint8),
+    }
+
+    layout, offset = {}, 0
+    for key, array in arrays.items():
+        layout[key] = {'dtype': array.dtype.str, 'offset': offset, 'length': len(array)}
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    header = json.dumps({'markers': markers, 'arrays': layout}).encode('utf-8')
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for key, array in arrays.items():
+            f.seek(data_start + layout[key]['offset'])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+
+
+class Catalog:
+    """
+    Read-only view of a catalog file. The file is memory-mapped and the
+    arrays are NumPy views into it, so opening is O(header) and only the
+    markers that are asked for get turned into antibody dicts.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not an antibody catalog")
+            (header_length,) = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(header_length).decode('utf-8'))
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        data_start = -(-(len(MAGIC) + 8 + header_length) // ALIGNMENT) * ALIGNMENT
+
+        self.markers = header['markers']
+        self.marker_index = {marker: i for i, marker in enumerate(self.markers)}
+        for key, spec in header['arrays'].items():
+            array = np.frombuffer(
+                self.buffer, dtype=np.dtype(spec['dtype']), count=spec['length'], offset=data_start + spec['offset']
+            )
+            setattr(self, key, array)
+
+    def __len__(self):
+        return len(self.ex)
+
+    def close(self):
+        # Drop the array views first; mmap refuses to close while they are exported
+        for key in ('marker_offsets', 'ex', 'em', 'name_offsets', 'name_blob'):
+            setattr(self, key, None)
+        self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def antibodies(self, marker):
+        """Returns the antibody dicts of one marker."""
+        i = self.marker_index[marker]
+        start, stop = int(self.marker_offsets[i]), int(self.marker_offsets[i + 1])
+        return self.build_records(start, stop)
+
+    def build_records(self, start, stop):
+        name_offsets = self.name_offsets[start:stop + 1].tolist()
+        base = name_offsets[0]
+        blob = self.name_blob[base:name_offsets[-1]].tobytes()
+        return [
+            {'name': blob[a - base:b - base].decode('utf-8'), 'ex': as_number(ex), 'em': as_number(em)}
+            for a, b, ex, em in zip(
+                name_offsets[:-1], name_offsets[1:], self.ex[start:stop].tolist(), self.em[start:stop].tolist()
+            )
+        ]
+
+    def to_panel(self, markers=None):
+        """Builds a Wizard panel for `markers` (all markers by default)."""
+        if markers is not None:
+            return {marker: self.antibodies(marker) for marker in markers}
+        # Whole catalog: convert every column once, then cut it per marker
+        records = self.build_records(0, len(self))
+        offsets = self.marker_offsets.tolist()
+        return {marker: records[offsets[i]:offsets[i + 1]] for i, marker in enumerate(self.markers)}
+
+
+def as_number(value):
+    return int(value) if value.is_integer() else value
+
+
+def load_catalog(path, markers=None):
+    """Loads a panel from a catalog file, optionally only for `markers`."""
+    with Catalog(path) as catalog:
+        return catalog.to_panel(markers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('command', choices=['import', 'export'])
+    parser.add_argument('source', help="panel .json/.csv to import, or catalog to export")
+    parser.add_argument('destination', help="catalog to write, or panel .json/.csv to export to")
+    args = parser.parse_args(argv)
+
+    if args.command == 'import':
+        panel = load_panel(args.source)
+        write_catalog(panel, args.destination)
+        print(f"Wrote {sum(len(abs_) for abs_ in panel.values())} antibodies for {len(panel)} markers to {args.destination}")
+    else:
+        save_panel(load_catalog(args.source), args.destination)
+        print(f"Exported {args.source} to {args.destination}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+from bisect import bisect_right
+
+
+class DetectorIndex:
+    """
+    Sorted interval index over a set of band-pass filters ({name: {'center', 'width'}}).
+    The band edges split the spectrum into elementary segments, each holding the
+    detectors that cover it, so an emission lookup is a single bisect. Overlapping
+    bands are all reported, in the order they appear in the configuration.
+    """
+
+    def __init__(self, filters):
+        bands = []
+        for name, props in filters.items():
+            low = props['center'] - props['width'] / 2
+            high = props['center'] + props['width'] / 2
+            if low < high:
+                bands.append((name, low, high))
+
+        self.edges = sorted({edge for _, low, high in bands for edge in (low, high)})
+        # hits[k] holds the detectors covering [edges[k], edges[k + 1])
+        self.hits = [[] for _ in range(max(len(self.edges) - 1, 0))]
+        for name, low, high in bands:
+            first = bisect_right(self.edges, low) - 1
+            last = bisect_right(self.edges, high) - 1
+            for segment in range(first, last):
+                self.hits[segment].append(name)
+        self.hits = [tuple(names) for names in self.hits]
+
+    def lookup(self, emission_val):
+        """Returns the names of all detectors whose band contains `emission_val`."""
+        segment = bisect_right(self.edges, emission_val) - 1
+        if 0 <= segment < len(self.hits):
+            return self.hits[segment]
+        return ()
@@ -1,30 +1,212 @@
 import sys
+import copy
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
 from PySide6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QGridLayout,
-    QLabel, QLineEdit, QPushButton, QTableWidget, QTableWidgetItem,
-    QListWidget, QTabWidget, QTextEdit, QHeaderView, QAbstractItemView,
-    QMessageBox
+    QLabel, QLineEdit, QPushButton, QTableWidget, QTableWidgetItem, QTableView,
+    QListWidget, QTabWidget, QPlainTextEdit, QHeaderView, QAbstractItemView,
+    QMessageBox, QCheckBox, QComboBox, QSpinBox, QFileDialog
 )
-from PySide6.QtGui import QTextCursor 
-from PySide6.QtCore import Qt, QObject, Signal
+from PySide6.QtCore import Qt, QObject, Signal, QThread, QTimer, QSortFilterProxyModel
 
-from wizard import Wizard
+from models import AntibodyTableModel, DetectorTableModel
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------------- #
+# Logging handler that buffers records for the GUI log widget
+# ------------------------------------------------------------------- #
+class BufferedLogHandler(logging.Handler):
+    """
+    Collects formatted log records from any thread. The GUI drains them on a
+    timer, so a burst of messages costs one widget update instead of one per line.
+    When more than MAX_PENDING lines pile up between two flushes the oldest are
+    dropped and counted.
+    """
+    MAX_PENDING = 5000
+
+    def __init__(self):
+        super().__init__()
+        self.pending = deque(maxlen=self.MAX_PENDING)
+        self.dropped = 0
+
+    def emit(self, record):
+        try:
+            message = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        self.acquire()
+        try:
+            if len(self.pending) == self.MAX_PENDING:
+                self.dropped += 1
+            self.pending.append(message)
+        finally:
+            self.release()
+
+    def take(self):
+        """Returns and clears the buffered lines and the number of lines dropped."""
+        self.acquire()
+        try:
+            lines, dropped = list(self.pending), self.dropped
+            self.pending.clear()
+            self.dropped = 0
+        finally:
+            self.release()
+        return lines, dropped
 
 # ------------------------------------------------------------------- #
-# Stream class for redirecting print statements
+# Background worker running the solver off the GUI thread
 # ------------------------------------------------------------------- #
-class Stream(QObject):
-    """A QObject that captures text and emits it as a Qt signal."""
-    textWritten = Signal(str)
+class AnalysisWorker(QObject):
+    """Runs the Wizard on a QThread and reports progress and panels through signals."""
+    progress = Signal(int, int, int)  # marker count, combinations tried, solutions found
+    panelsFound = Signal(object)      # list of (markers_used, panel, score) tuples; score may be None
+    failed = Signal(str)
+    finished = Signal()
+
+    # Only the first panels are shown live; the full set always goes to disk
+    MAX_LIVE_PANELS = 500
+    PANEL_BATCH_SIZE = 50
+    # Minimum number of seconds between two progress signals
+    PROGRESS_INTERVAL = 0.1
+
+    def __init__(self, panel_data, instrument_data, enumerate_all, top_k=0, compatible_panel=None, optimize=False,
+                 time_budget=None, excitation_tolerance=None):
+        super().__init__()
+        # Work on copies so edits in the GUI cannot race with the search
+        self.panel_data = copy.deepcopy(panel_data)
+        self.instrument_data = copy.deepcopy(instrument_data)
+        # Already filtered panel (e.g. from a SolverSession); filtered again when None
+        self.compatible_panel = copy.deepcopy(compatible_panel)
+        self.enumerate_all = enumerate_all
+        self.top_k = top_k
+        # Anytime branch and bound for the single least-spillover panel
+        self.optimize = optimize
+        self.time_budget = time_budget
+        self.excitation_tolerance = excitation_tolerance
+        self.stop_event = threading.Event()
+        self.last_progress = None
+        self.last_progress_time = 0.0
+
+    def cancel(self):
+        self.stop_event.set()
+
+    def on_progress(self, num_markers, combinations_tried, solutions_found):
+        self.last_progress = (num_markers, combinations_tried, solutions_found)
+        now = time.monotonic()
+        if now - self.last_progress_time >= self.PROGRESS_INTERVAL:
+            self.last_progress_time = now
+            self.progress.emit(*self.last_progress)
+
+    def forward_panels(self, solutions):
+        """Passes solutions through while sending the first ones to the GUI in batches."""
+        batch, shown = [], 0
+        for markers_used, panel in solutions:
+            if shown < self.MAX_LIVE_PANELS:
+                batch.append((markers_used, panel, None))
+                shown += 1
+                if len(batch) >= self.PANEL_BATCH_SIZE:
+                    self.panelsFound.emit(batch)
+                    batch = []
+            yield markers_used, panel
+        if batch:
+            self.panelsFound.emit(batch)
+
+    def run(self):
+        try:
+            from wizard import Wizard
+            wizard = Wizard(self.panel_data, self.instrument_data, self.excitation_tolerance)
+            compatible_panel = self.compatible_panel
+            if compatible_panel is None:
+                compatible_panel = wizard.prepare_and_filter_panel()
+            if not compatible_panel:
+                logger.warning("No antibodies were compatible with the instrument.")
+            elif self.optimize:
+                best = wizard.find_optimal_panel(
+                    compatible_panel, time_budget=self.time_budget, stop_event=self.stop_event
+                )
+                if best is not None:
+                    self.panelsFound.emit([(best['markers_used'], best['panel'], best['score'])])
+                    self.progress.emit(len(best['markers_used']), 1, 1)
+                    wizard.save_ranked_panels([best], wizard.get_default_output_path())
+                    if best['optimal']:
+                        logger.info(f"SUCCESS: Found the least-spillover panel for {len(best['markers_used'])} markers.")
+            elif self.enumerate_all and self.top_k:
+                ranked = wizard.find_top_panels(
+                    compatible_panel, self.top_k, progress_callback=self.on_progress, stop_event=self.stop_event
+                )
+                self.panelsFound.emit([(p['markers_used'], p['panel'], p['score']) for p in ranked])
+                wizard.save_ranked_panels(ranked, wizard.get_default_output_path())
+                if self.last_progress is not None:
+                    self.progress.emit(*self.last_progress)
+                if self.stop_event.is_set():
+                    logger.warning("Analysis cancelled. The best panels found so far were saved.")
+            elif self.enumerate_all:
+                solutions = wizard.iter_solutions(
+                    compatible_panel, progress_callback=self.on_progress, stop_event=self.stop_event
+                )
+                found_solutions = wizard.save_solutions(
+                    self.forward_panels(solutions), wizard.get_default_output_path(), keep_results=False
+                )
+                if found_solutions:
+                    num_markers = len(found_solutions[0]['markers_used'])
+                    logger.info(f"SUCCESS: Found {len(found_solutions)} solution set(s) for {num_markers} markers.")
+                else:
+                    logger.warning("No possible solution found.")
+                if self.last_progress is not None:
+                    self.progress.emit(*self.last_progress)
+                if self.stop_event.is_set():
+                    logger.warning("Analysis cancelled. Panels found so far were saved.")
+            else:
+                results = wizard.find_witness_solution(compatible_panel)
+                if results:
+                    self.panelsFound.emit([(results[0]['markers_used'], results[0]['solutions'][0], None)])
+                    self.progress.emit(len(results[0]['markers_used']), 1, 1)
+                    wizard.save_results_to_csv(results, wizard.get_default_output_path())
+            for line in wizard.stats.summary_lines():
+                logger.info(line)
+        except Exception as e:
+            self.failed.emit(str(e))
+        finally:
+            self.finished.emit()
+
+class ScreeningWorker(QObject):
+    """Ranks instruments for the panel on a QThread, solving them on a process pool."""
+    ranked = Signal(object)  # `screening_rows` of the ranking
+    failed = Signal(str)
+    finished = Signal()
 
-    def __init__(self, parent=None):
-        super().__init__(parent)
+    def __init__(self, panel_data, instruments, excitation_tolerance=None):
+        super().__init__()
+        self.panel_data = copy.deepcopy(panel_data)
+        self.instruments = copy.deepcopy(instruments)
+        self.excitation_tolerance = excitation_tolerance
+        self.workers = min(len(instruments), os.cpu_count() or 1)
+        self.stop_event = threading.Event()
 
-    def write(self, text):
-        self.textWritten.emit(str(text))
+    def cancel(self):
+        self.stop_event.set()
 
-    def flush(self):
-        pass
+    def run(self):
+        try:
+            from screening import screen_instruments, screening_rows
+            # Pool processes are spawned, since forking a running Qt application is unsafe
+            rows = screen_instruments(
+                self.panel_data, self.instruments, self.workers, self.excitation_tolerance,
+                mp_context=multiprocessing.get_context('spawn'), stop_event=self.stop_event
+            )
+            if rows is not None:
+                self.ranked.emit(screening_rows(rows))
+        except Exception as e:
+            self.failed.emit(str(e))
+        finally:
+            self.finished.emit()
 
 # ------------------------------------------------------------------- #
 # MAIN APPLICATION WINDOW
@@ -51,6 +233,14 @@ class MainWindow(QWidget):
         }
     }
 
+    # Same default as Wizard.EXCITATION_TOLERANCE, which is not imported at startup
+    DEFAULT_EXCITATION_TOLERANCE = 10
+
+    # Solver verbosity choices offered in the log header
+    LOG_LEVELS = {'Quiet': logging.WARNING, 'Normal': logging.INFO, 'Verbose': logging.DEBUG}
+    LOG_MAX_LINES = 5000
+    LOG_FLUSH_INTERVAL_MS = 100
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Antibody Panel Solver")
@@ -60,8 +250,24 @@ class MainWindow(QWidget):
         self.panel_data = {}
         self.instrument_data = {}
 
+        # Other instruments to compare the panel on: {label: instrument_config}
+        self.screening_instruments = {}
+
+        # Background analysis, set while a run is in progress
+        self.analysis_thread = None
+        self.analysis_worker = None
+        # Background instrument comparison, set while it runs
+        self.screening_thread = None
+        self.screening_worker = None
+        self.live_panel_count = 0
+
         self.init_ui()
         self.load_default_instrument()
+        # Tracks the maximum marker count live as the panel and instrument are
+        # edited. Built on the first edit or run, so the solver and NumPy are
+        # not imported before the window shows up.
+        self.session = None
+        self.update_capacity_label()
         self.connect_logger()
 
 
@@ -73,31 +279,97 @@ class MainWindow(QWidget):
 
         self.create_instrument_tab()
         self.create_panel_tab()
-
+        self.create_results_tab()
+        self.create_screening_tab()
+
+        self.enumerate_checkbox = QCheckBox("List every panel with the maximum number of markers (slow for large panels)")
+        main_layout.addWidget(self.enumerate_checkbox)
+
+        top_k_layout = QHBoxLayout()
+        top_k_layout.addWidget(QLabel("Keep only the best panels by spillover (0 = keep all):"))
+        self.top_k_spinbox = QSpinBox()
+        self.top_k_spinbox.setRange(0, 1000000)
+        self.top_k_spinbox.setValue(100)
+        top_k_layout.addWidget(self.top_k_spinbox)
+        top_k_layout.addStretch()
+        main_layout.addLayout(top_k_layout)
+
+        optimize_layout = QHBoxLayout()
+        self.optimize_checkbox = QCheckBox("Find only the single least-spillover panel, stopping after (0 = no limit):")
+        optimize_layout.addWidget(self.optimize_checkbox)
+        self.time_budget_spinbox = QSpinBox()
+        self.time_budget_spinbox.setRange(0, 86400)
+        self.time_budget_spinbox.setValue(10)
+        self.time_budget_spinbox.setSuffix(" s")
+        optimize_layout.addWidget(self.time_budget_spinbox)
+        optimize_layout.addStretch()
+        main_layout.addLayout(optimize_layout)
+
+        run_layout = QHBoxLayout()
         self.run_button = QPushButton("Run Analysis")
         self.run_button.setFixedHeight(40)
         self.run_button.clicked.connect(self.run_analysis)
-        main_layout.addWidget(self.run_button)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setFixedHeight(40)
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_analysis)
+        run_layout.addWidget(self.run_button, 3)
+        run_layout.addWidget(self.cancel_button, 1)
+        main_layout.addLayout(run_layout)
+
+        self.progress_label = QLabel("Idle.")
+        main_layout.addWidget(self.progress_label)
+        self.capacity_label = QLabel()
+        main_layout.addWidget(self.capacity_label)
         
-        main_layout.addWidget(QLabel("Log:"))
-        self.log_output = QTextEdit()
+        log_header_layout = QHBoxLayout()
+        log_header_layout.addWidget(QLabel("Log:"))
+        log_header_layout.addStretch()
+        log_header_layout.addWidget(QLabel("Solver verbosity:"))
+        self.log_level_combo = QComboBox()
+        for label in self.LOG_LEVELS:
+            self.log_level_combo.addItem(label)
+        self.log_level_combo.setCurrentText("Normal")
+        self.log_level_combo.currentTextChanged.connect(self.set_log_level)
+        log_header_layout.addWidget(self.log_level_combo)
+        main_layout.addLayout(log_header_layout)
+
+        self.log_output = QPlainTextEdit()
         self.log_output.setReadOnly(True)
+        # Old lines are discarded so the widget never grows without bound
+        self.log_output.setMaximumBlockCount(self.LOG_MAX_LINES)
         main_layout.addWidget(self.log_output)
 
     def connect_logger(self):
-        """Redirects stdout to the GUI log widget."""
-        self.stream = Stream()
-        self.stream.textWritten.connect(self.on_log_update)
-        sys.stdout = self.stream
-        print("GUI Initialized. Default instrument configuration loaded.")
-
-    def on_log_update(self, text):
-        """Slot to receive text and append it to the log."""
-        self.log_output.moveCursor(QTextCursor.MoveOperation.End)
-        self.log_output.insertPlainText(text)
+        """Routes log records to the GUI log widget through a buffered handler."""
+        self.log_handler = BufferedLogHandler()
+        self.log_handler.setFormatter(logging.Formatter('%(message)s'))
+        root_logger = logging.getLogger()
+        root_logger.addHandler(self.log_handler)
+        root_logger.setLevel(logging.DEBUG)
+        self.set_log_level(self.log_level_combo.currentText())
+
+        self.log_timer = QTimer(self)
+        self.log_timer.setInterval(self.LOG_FLUSH_INTERVAL_MS)
+        self.log_timer.timeout.connect(self.flush_log)
+        self.log_timer.start()
+        logger.info("GUI Initialized. Default instrument configuration loaded.")
+
+    def set_log_level(self, label):
+        """Sets how much the solver reports; 'Verbose' lists every filtered antibody."""
+        logging.getLogger('wizard').setLevel(self.LOG_LEVELS[label])
+
+    def flush_log(self):
+        """Timer slot: appends everything buffered since the last flush in one go."""
+        lines, dropped = self.log_handler.take()
+        if dropped:
+            lines.insert(0, f"[... {dropped} log line(s) dropped ...]")
+        if lines:
+            self.log_output.appendPlainText('\n'.join(lines))
 
     def load_default_instrument(self):
-        self.instrument_data = self.DEFAULT_INSTRUMENT_CONFIG.copy()
+        # Deep copy: the detector model edits the nested dicts in place
+        self.instrument_data = copy.deepcopy(self.DEFAULT_INSTRUMENT_CONFIG)
         
         # Populate the laser list
         self.laser_list_widget.clear()
@@ -129,6 +401,19 @@ class MainWindow(QWidget):
         laser_input_layout.addWidget(add_laser_btn)
         laser_input_layout.addWidget(remove_laser_btn)
         laser_pane_layout.addLayout(laser_input_layout)
+
+        tolerance_layout = QHBoxLayout()
+        tolerance_layout.addWidget(QLabel("Excitation tolerance:"))
+        self.excitation_tolerance_spinbox = QSpinBox()
+        self.excitation_tolerance_spinbox.setRange(0, 200)
+        self.excitation_tolerance_spinbox.setValue(self.DEFAULT_EXCITATION_TOLERANCE)
+        self.excitation_tolerance_spinbox.setSuffix(" nm")
+        self.excitation_tolerance_spinbox.setToolTip(
+            "Every laser within this distance of an antibody's excitation peak can excite it"
+        )
+        self.excitation_tolerance_spinbox.valueChanged.connect(self.on_excitation_tolerance_changed)
+        tolerance_layout.addWidget(self.excitation_tolerance_spinbox)
+        laser_pane_layout.addLayout(tolerance_layout)
         
         main_layout.addLayout(laser_pane_layout, 1) # 1/3 of the space
 
@@ -137,10 +422,13 @@ class MainWindow(QWidget):
         self.detector_header_label = QLabel("Detectors for Selected Laser")
         detector_pane_layout.addWidget(self.detector_header_label)
         
-        self.detector_table = QTableWidget(0, 3)
-        self.detector_table.setHorizontalHeaderLabels(['Name', 'Center (nm)', 'Width (nm)'])
-        self.detector_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        self.detector_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.detector_model = DetectorTableModel(self)
+        self.detector_proxy = self.create_filter_proxy(self.detector_model)
+        self.detector_filter_input = QLineEdit()
+        self.detector_filter_input.setPlaceholderText("Filter detectors by name...")
+        self.detector_filter_input.textChanged.connect(self.detector_proxy.setFilterFixedString)
+        detector_pane_layout.addWidget(self.detector_filter_input)
+        self.detector_table = self.create_table_view(self.detector_proxy)
         detector_pane_layout.addWidget(self.detector_table)
 
         detector_input_layout = QGridLayout()
@@ -196,10 +484,13 @@ class MainWindow(QWidget):
         ab_layout = QVBoxLayout()
         self.ab_header_label = QLabel("Antibodies for Selected Marker:")
         ab_layout.addWidget(self.ab_header_label)
-        self.antibody_table = QTableWidget(0, 3)
-        self.antibody_table.setHorizontalHeaderLabels(['Name', 'Ex (nm)', 'Em (nm)'])
-        self.antibody_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        self.antibody_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.antibody_model = AntibodyTableModel(self)
+        self.antibody_proxy = self.create_filter_proxy(self.antibody_model)
+        self.antibody_filter_input = QLineEdit()
+        self.antibody_filter_input.setPlaceholderText("Filter antibodies by name...")
+        self.antibody_filter_input.textChanged.connect(self.antibody_proxy.setFilterFixedString)
+        ab_layout.addWidget(self.antibody_filter_input)
+        self.antibody_table = self.create_table_view(self.antibody_proxy)
         ab_layout.addWidget(self.antibody_table)
 
         ab_input_layout = QGridLayout()
@@ -226,6 +517,71 @@ class MainWindow(QWidget):
         
         self.tabs.addTab(tab, "2. Antibody Panel")
 
+    def create_filter_proxy(self, model):
+        """Wraps a table model in a proxy that sorts and filters on the name column."""
+        proxy = QSortFilterProxyModel(self)
+        proxy.setSourceModel(model)
+        proxy.setFilterKeyColumn(0)
+        proxy.setFilterCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        return proxy
+
+    def create_table_view(self, proxy):
+        view = QTableView()
+        view.setModel(proxy)
+        view.setSortingEnabled(True)
+        view.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        view.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        view.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        return view
+
+    def selected_source_row(self, view, proxy):
+        """Returns the model row selected in `view`, or -1 when nothing is selected."""
+        index = view.currentIndex()
+        if not index.isValid():
+            return -1
+        return proxy.mapToSource(index).row()
+
+    def create_results_tab(self):
+        tab = QWidget()
+        layout = QVBoxLayout(tab)
+        self.results_header_label = QLabel(f"Panels found (the first {AnalysisWorker.MAX_LIVE_PANELS} are shown, all are saved to file):")
+        layout.addWidget(self.results_header_label)
+        self.results_table = QTableWidget(0, 8)
+        self.results_table.setHorizontalHeaderLabels(['Panel', 'Markers Used', 'Marker', 'Antibody', 'Laser (nm)', 'Em (nm)', 'Detector', 'Spillover'])
+        self.results_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.results_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        layout.addWidget(self.results_table)
+        self.tabs.addTab(tab, "3. Results")
+
+    def create_screening_tab(self):
+        tab = QWidget()
+        layout = QVBoxLayout(tab)
+        layout.addWidget(QLabel("Instruments to compare the panel on (the one set up in tab 1 is always included):"))
+        self.screening_list = QListWidget()
+        layout.addWidget(self.screening_list)
+
+        button_layout = QHBoxLayout()
+        add_btn = QPushButton("Add Instrument Files...")
+        remove_btn = QPushButton("Remove Selected")
+        self.compare_button = QPushButton("Compare Instruments")
+        add_btn.clicked.connect(self.add_screening_instruments)
+        remove_btn.clicked.connect(self.remove_screening_instrument)
+        self.compare_button.clicked.connect(self.compare_instruments)
+        button_layout.addWidget(add_btn)
+        button_layout.addWidget(remove_btn)
+        button_layout.addStretch()
+        button_layout.addWidget(self.compare_button)
+        layout.addLayout(button_layout)
+
+        self.screening_table = QTableWidget(0, 6)
+        self.screening_table.setHorizontalHeaderLabels(
+            ['Rank', 'Instrument', 'Max Markers', 'Markers Used', 'Markers Omitted', 'Options']
+        )
+        self.screening_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.screening_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        layout.addWidget(self.screening_table)
+        self.tabs.addTab(tab, "4. Compare Instruments")
+
     def add_laser(self):
         try:
             laser_val = int(self.laser_input.text().strip())
@@ -238,6 +594,7 @@ class MainWindow(QWidget):
 
             self.instrument_data['lasers'][laser_val] = {}
             self.laser_list_widget.addItem(str(laser_val))
+            self.on_laser_edited(laser_val)
             self.laser_input.clear()
         except ValueError:
             QMessageBox.critical(self, "Input Error", "Please enter a valid integer for the laser.")
@@ -252,26 +609,19 @@ class MainWindow(QWidget):
         laser_val = int(current_item.text())
         del self.instrument_data['lasers'][laser_val]
         self.laser_list_widget.takeItem(self.laser_list_widget.row(current_item))
+        self.on_laser_edited(laser_val)
         # The currentItemChanged signal will fire, auto-updating the detector table
         
     ### NEW: Slot that updates the detector table when a new laser is selected
     def update_detector_table(self, current_item, previous_item):
-        self.detector_table.setRowCount(0) # Clear the table
-        
         if not current_item:
             self.detector_header_label.setText("Detectors for Selected Laser")
+            self.detector_model.set_detectors(None, None)
             return
 
         laser_val = int(current_item.text())
         self.detector_header_label.setText(f"Detectors for Laser {laser_val} nm")
-        
-        detectors = self.instrument_data['lasers'].get(laser_val, {})
-        for name, props in detectors.items():
-            row_pos = self.detector_table.rowCount()
-            self.detector_table.insertRow(row_pos)
-            self.detector_table.setItem(row_pos, 0, QTableWidgetItem(name))
-            self.detector_table.setItem(row_pos, 1, QTableWidgetItem(str(props['center'])))
-            self.detector_table.setItem(row_pos, 2, QTableWidgetItem(str(props['width'])))
+        self.detector_model.set_detectors(laser_val, self.instrument_data['lasers'].get(laser_val))
 
 
     def add_detector(self):
@@ -280,8 +630,6 @@ class MainWindow(QWidget):
             QMessageBox.warning(self, "Input Error", "Please select a laser first.")
             return
         
-        laser_val = int(current_laser_item.text())
-        
         try:
             name = self.d_name_input.text().strip()
             center = int(self.d_center_input.text())
@@ -289,8 +637,8 @@ class MainWindow(QWidget):
             if not name:
                 raise ValueError("Detector name cannot be empty.")
             
-            self.instrument_data['lasers'][laser_val][name] = {'center': center, 'width': width}
-            self.update_detector_table(current_laser_item, None) # Refresh table view
+            self.detector_model.set_detector(name, {'center': center, 'width': width})
+            self.on_laser_edited(self.detector_model.laser)
             
             self.d_name_input.clear()
             self.d_center_input.clear()
@@ -300,17 +648,14 @@ class MainWindow(QWidget):
             
     def remove_detector(self):
         current_laser_item = self.laser_list_widget.currentItem()
-        selected_detector_row = self.detector_table.currentRow()
+        selected_detector_row = self.selected_source_row(self.detector_table, self.detector_proxy)
         
         if not current_laser_item or selected_detector_row < 0:
             QMessageBox.warning(self, "Selection Error", "Please select a laser and a detector to remove.")
             return
 
-        laser_val = int(current_laser_item.text())
-        detector_name = self.detector_table.item(selected_detector_row, 0).text()
-        
-        del self.instrument_data['lasers'][laser_val][detector_name]
-        self.update_detector_table(current_laser_item, None) # Refresh table view
+        self.detector_model.remove_detector(selected_detector_row)
+        self.on_laser_edited(self.detector_model.laser)
 
     def add_filter(self):
         try:
@@ -342,6 +687,7 @@ class MainWindow(QWidget):
         if name and name not in self.panel_data:
             self.panel_data[name] = []
             self.marker_list.addItem(name)
+            self.notify_session('marker_added', name)
             self.marker_name_input.clear()
         else:
             QMessageBox.warning(self, "Input Error", "Marker name cannot be empty or a duplicate.")
@@ -351,28 +697,21 @@ class MainWindow(QWidget):
         if current_item:
             name = current_item.text()
             del self.panel_data[name]
+            self.notify_session('marker_removed', name)
             self.marker_list.takeItem(self.marker_list.row(current_item))
-            self.antibody_table.setRowCount(0) # Clear table
+            self.antibody_model.set_antibodies(None, None) # Clear table
         else:
             QMessageBox.warning(self, "Selection Error", "Please select a marker to remove.")
 
     def update_antibody_table(self, current, previous):
         if not current:
             self.ab_header_label.setText("Antibodies for Selected Marker:")
-            self.antibody_table.setRowCount(0)
+            self.antibody_model.set_antibodies(None, None)
             return
         
         marker_name = current.text()
         self.ab_header_label.setText(f"Antibodies for: {marker_name}")
-        self.antibody_table.setRowCount(0) # Clear
-        
-        antibodies = self.panel_data.get(marker_name, [])
-        for ab in antibodies:
-            row_pos = self.antibody_table.rowCount()
-            self.antibody_table.insertRow(row_pos)
-            self.antibody_table.setItem(row_pos, 0, QTableWidgetItem(ab['name']))
-            self.antibody_table.setItem(row_pos, 1, QTableWidgetItem(str(ab['ex'])))
-            self.antibody_table.setItem(row_pos, 2, QTableWidgetItem(str(ab['em'])))
+        self.antibody_model.set_antibodies(marker_name, self.panel_data.get(marker_name))
 
     def add_antibody(self):
         current_marker_item = self.marker_list.currentItem()
@@ -380,15 +719,15 @@ class MainWindow(QWidget):
             QMessageBox.warning(self, "Input Error", "Please select a marker first.")
             return
         
-        marker_name = current_marker_item.text()
         try:
             name = self.ab_name_input.text().strip()
             ex = int(self.ab_ex_input.text())
             em = int(self.ab_em_input.text())
             if not name: raise ValueError("Name cannot be empty.")
             
-            self.panel_data[marker_name].append({'name': name, 'ex': ex, 'em': em})
-            self.update_antibody_table(current_marker_item, None)
+            antibody = {'name': name, 'ex': ex, 'em': em}
+            self.antibody_model.add_antibody(antibody)
+            self.notify_session('antibody_added', self.antibody_model.marker, antibody)
             
             self.ab_name_input.clear()
             self.ab_ex_input.clear()
@@ -398,23 +737,109 @@ class MainWindow(QWidget):
 
     def remove_antibody(self):
         current_marker_item = self.marker_list.currentItem()
-        selected_ab_row = self.antibody_table.currentRow()
+        selected_ab_row = self.selected_source_row(self.antibody_table, self.antibody_proxy)
         
         if not current_marker_item or selected_ab_row < 0:
             QMessageBox.warning(self, "Selection Error", "Please select a marker and an antibody to remove.")
             return
         
-        marker_name = current_marker_item.text()
-        self.panel_data[marker_name].pop(selected_ab_row)
-        self.update_antibody_table(current_marker_item, None)
+        antibody = self.antibody_model.antibodies[selected_ab_row]
+        self.antibody_model.remove_antibody(selected_ab_row)
+        self.notify_session('antibody_removed', self.antibody_model.marker, antibody)
+
+    def on_laser_edited(self, laser_val):
+        self.notify_session('laser_changed', laser_val)
+
+    def on_excitation_tolerance_changed(self, value):
+        self.notify_session('excitation_tolerance_changed', value)
+
+    def get_session(self):
+        """Returns the solver session, importing the solver and building it on first use."""
+        if self.session is None:
+            from session import SolverSession
+            self.session = SolverSession(
+                self.panel_data, self.instrument_data, self.excitation_tolerance_spinbox.value()
+            )
+        return self.session
+
+    def notify_session(self, event, *args):
+        """Passes a panel or instrument edit on to the session and refreshes the capacity label."""
+        if self.session is None:
+            # A new session is built from the current data, which already has the edit
+            self.get_session()
+        else:
+            getattr(self.session, event)(*args)
+        self.update_capacity_label()
+
+    def update_capacity_label(self):
+        """Shows the session's current maximum marker count."""
+        # Without a session nothing has been edited yet, and the panel starts out empty
+        max_markers = self.session.max_markers() if self.session is not None else 0
+        self.capacity_label.setText(f"Markers that fit on the instrument: {max_markers} of {len(self.panel_data)}")
+
+    def add_screening_instruments(self):
+        paths, _ = QFileDialog.getOpenFileNames(
+            self, "Add Instruments", "", "Instrument definitions (*.json *.csv)"
+        )
+        if paths:
+            self.load_screening_instruments(paths)
+
+    def load_screening_instruments(self, paths):
+        """Reads instrument files into the comparison list; files that fail to load are reported and skipped."""
+        from loaders import load_instrument
+        for path in paths:
+            try:
+                instrument = load_instrument(path)
+            except (OSError, ValueError, KeyError) as e:
+                QMessageBox.warning(self, "Load Error", f"Could not read {path}:\n{e}")
+                continue
+            self.screening_instruments[path] = instrument
+            if not self.screening_list.findItems(path, Qt.MatchFlag.MatchExactly):
+                self.screening_list.addItem(path)
+
+    def remove_screening_instrument(self):
+        current_item = self.screening_list.currentItem()
+        if current_item:
+            del self.screening_instruments[current_item.text()]
+            self.screening_list.takeItem(self.screening_list.row(current_item))
+        else:
+            QMessageBox.warning(self, "Selection Error", "Please select an instrument to remove.")
+
+    def compare_instruments(self):
+        """Ranks the current instrument and the added ones by how many markers of the panel they fit."""
+        if not self.panel_data or all(not v for v in self.panel_data.values()):
+            QMessageBox.warning(self, "Input Error", "Please add at least one marker with one antibody.")
+            return
+        instruments = {"Current setup": self.instrument_data, **self.screening_instruments}
+        self.compare_button.setEnabled(False)
+        self.screening_table.setRowCount(0)
+
+        # Solved on a background thread so the window stays responsive
+        self.screening_thread = QThread(self)
+        self.screening_worker = ScreeningWorker(
+            self.panel_data, instruments, self.excitation_tolerance_spinbox.value()
+        )
+        self.screening_worker.moveToThread(self.screening_thread)
+        self.screening_thread.started.connect(self.screening_worker.run)
+        self.screening_worker.ranked.connect(self.on_instruments_ranked)
+        self.screening_worker.failed.connect(self.on_screening_failed)
+        self.screening_worker.finished.connect(self.screening_thread.quit)
+        self.screening_thread.finished.connect(self.on_screening_finished)
+        self.screening_thread.start()
+
+    def on_instruments_ranked(self, rows):
+        self.screening_table.setRowCount(0)
+        for values in rows:
+            row_pos = self.screening_table.rowCount()
+            self.screening_table.insertRow(row_pos)
+            for column, value in enumerate(values):
+                self.screening_table.setItem(row_pos, column, QTableWidgetItem(str(value)))
 
     # --- All your slot functions like add_filter, add_marker, etc. go here ---
     # These methods were also correct in your previous code.
 
     def run_analysis(self):
         self.log_output.clear()
-        self.run_button.setEnabled(False)
-        QApplication.processEvents()
 
         try:
             # 1. Assemble data from GUI (now much simpler)
@@ -425,22 +850,123 @@ class MainWindow(QWidget):
                 raise ValueError("Please add at least one detector to one of the lasers.")
             if not self.panel_data or all(not v for v in self.panel_data.values()):
                 raise ValueError("Please add at least one marker with one antibody.")
-
-            # 2. Instantiate Wizard and run
-            print("Data assembled. Starting analysis...\n")
-            # The instrument data is already in the correct format
-            wizard = Wizard(self.panel_data, self.instrument_data)
-            wizard.run()
-
-        except Exception as e:
-            error_message = f"ERROR: {e}"
-            print(error_message)
+        except ValueError as e:
+            logger.error(f"ERROR: {e}")
             QMessageBox.critical(self, "Analysis Error", str(e))
+            return
 
-        finally:
-            self.run_button.setEnabled(True)
+        self.results_table.setRowCount(0)
+        self.live_panel_count = 0
+        optimize = self.optimize_checkbox.isChecked()
+        if not self.enumerate_checkbox.isChecked() and not optimize:
+            self.show_session_witness()
+            return
+
+        # 2. Run the Wizard on a background thread so the window stays responsive
+        logger.info("Data assembled. Starting analysis...")
+        self.progress_label.setText("Starting...")
+        self.run_button.setEnabled(False)
+        self.cancel_button.setEnabled(True)
+
+        self.analysis_thread = QThread(self)
+        self.analysis_worker = AnalysisWorker(
+            self.panel_data, self.instrument_data, self.enumerate_checkbox.isChecked(), self.top_k_spinbox.value(),
+            self.get_session().compatible_panel(), optimize, self.time_budget_spinbox.value() or None,
+            self.excitation_tolerance_spinbox.value()
+        )
+        self.analysis_worker.moveToThread(self.analysis_thread)
+        self.analysis_thread.started.connect(self.analysis_worker.run)
+        self.analysis_worker.progress.connect(self.on_analysis_progress)
+        self.analysis_worker.panelsFound.connect(self.on_panels_found)
+        self.analysis_worker.failed.connect(self.on_analysis_failed)
+        self.analysis_worker.finished.connect(self.analysis_thread.quit)
+        self.analysis_thread.finished.connect(self.on_analysis_finished)
+        self.analysis_thread.start()
+
+    def show_session_witness(self):
+        """The maximum marker count is already known from the session; save its witness panel."""
+        results = self.get_session().witness_results()
+        if not results:
+            logger.warning("No possible solution found.")
+            return
+        num_markers = len(results[0]['markers_used'])
+        logger.info(f"SUCCESS: At most {num_markers} markers fit on the instrument.")
+        self.on_panels_found([(results[0]['markers_used'], results[0]['solutions'][0], None)])
+        self.on_analysis_progress(num_markers, 1, 1)
+        try:
+            self.session.wizard.save_results_to_csv(results, self.session.wizard.get_default_output_path())
+        except OSError as e:
+            self.on_analysis_failed(str(e))
+
+    def cancel_analysis(self):
+        if self.analysis_worker is not None:
+            self.analysis_worker.cancel()
+            self.cancel_button.setEnabled(False)
+            self.progress_label.setText("Cancelling...")
+
+    def on_analysis_progress(self, num_markers, combinations_tried, solutions_found):
+        self.progress_label.setText(
+            f"Markers: {num_markers} | Combinations tried: {combinations_tried} | Solutions found: {solutions_found}"
+        )
+
+    def on_panels_found(self, batch):
+        """Appends a batch of panels to the results table."""
+        self.results_table.setUpdatesEnabled(False)
+        for markers_used, panel, score in batch:
+            self.live_panel_count += 1
+            markers_used_str = ', '.join(markers_used)
+            for antibody in panel:
+                row_pos = self.results_table.rowCount()
+                self.results_table.insertRow(row_pos)
+                values = [
+                    self.live_panel_count, markers_used_str, antibody['marker'], antibody['name'],
+                    antibody['used_laser'], antibody['em'], antibody['detector_name'],
+                    '' if score is None else f"{score:.4f}"
+                ]
+                for column, value in enumerate(values):
+                    self.results_table.setItem(row_pos, column, QTableWidgetItem(str(value)))
+        self.results_table.setUpdatesEnabled(True)
+
+    def on_analysis_failed(self, message):
+        logger.error(f"ERROR: {message}")
+        QMessageBox.critical(self, "Analysis Error", message)
+
+    def on_analysis_finished(self):
+        self.analysis_worker.deleteLater()
+        self.analysis_thread.deleteLater()
+        self.analysis_worker = None
+        self.analysis_thread = None
+        self.run_button.setEnabled(True)
+        self.cancel_button.setEnabled(False)
+        if self.progress_label.text() in ("Starting...", "Cancelling..."):
+            self.progress_label.setText("Idle.")
+
+    def on_screening_failed(self, message):
+        logger.error(f"ERROR: {message}")
+        QMessageBox.critical(self, "Comparison Error", message)
+
+    def on_screening_finished(self):
+        self.screening_worker.deleteLater()
+        self.screening_thread.deleteLater()
+        self.screening_worker = None
+        self.screening_thread = None
+        self.compare_button.setEnabled(True)
+
+    def closeEvent(self, event):
+        # Stop a running search cleanly before the window goes away
+        if self.analysis_thread is not None:
+            self.analysis_worker.cancel()
+            self.analysis_thread.quit()
+            self.analysis_thread.wait()
+        if self.screening_thread is not None:
+            self.screening_worker.cancel()
+            self.screening_thread.quit()
+            self.screening_thread.wait()
+        super().closeEvent(event)
 
 if __name__ == '__main__':
+    # Lets the spawned pool processes start in a frozen build
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
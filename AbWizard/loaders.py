@@ -0,0 +1,128 @@
+import csv
+import json
+import os
+
+# Columns expected in CSV definitions
+PANEL_COLUMNS = ('marker', 'name', 'ex', 'em')
+INSTRUMENT_COLUMNS = ('laser', 'detector', 'center', 'width')
+# File types `load_panel` and `load_instrument` read; only panels can be binary catalogs
+PANEL_EXTENSIONS = ('.json', '.csv', '.abcat')
+INSTRUMENT_EXTENSIONS = ('.json', '.csv')
+
+
+def parse_number(value):
+    """Reads a wavelength, keeping integral values as ints like the built-in configurations."""
+    number = float(value)
+    return int(number) if number.is_integer() else number
+
+
+def read_csv_rows(path, columns):
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        missing = [c for c in columns if c not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"{path}: missing column(s) {', '.join(missing)}")
+        return list(reader)
+
+
+# ------------------------------------------------------------------- #
+# Antibody panels
+# ------------------------------------------------------------------- #
+def load_panel(path):
+    """
+    Loads an antibody panel as {marker: [{'name', 'ex', 'em'}, ...]}.
+    JSON files hold that mapping directly; CSV files have one antibody per
+    row with `marker`, `name`, `ex` and `em` columns; `.abcat` files are
+    binary catalogs (see catalog.py).
+    """
+    if path.lower().endswith('.abcat'):
+        from catalog import load_catalog
+        return load_catalog(path)
+    if path.lower().endswith('.csv'):
+        panel = {}
+        for row in read_csv_rows(path, PANEL_COLUMNS):
+            panel.setdefault(row['marker'], []).append(
+                {'name': row['name'], 'ex': parse_number(row['ex']), 'em': parse_number(row['em'])}
+            )
+        return panel
+
+    with open(path) as f:
+        data = json.load(f)
+    panel = {}
+    for marker, antibodies in data.items():
+        for ab in antibodies:
+            missing = [key for key in PANEL_COLUMNS[1:] if key not in ab]
+            if missing:
+                raise ValueError(f"{path}: an antibody of marker '{marker}' has no {', '.join(missing)}")
+        panel[marker] = [{**ab, 'ex': parse_number(ab['ex']), 'em': parse_number(ab['em'])} for ab in antibodies]
+    return panel
+
+
+def save_panel(panel, path):
+    """Writes a panel as JSON, CSV or a binary catalog, following the extension."""
+    if path.lower().endswith('.abcat'):
+        from catalog import write_catalog
+        write_catalog(panel, path)
+        return
+    if path.lower().endswith('.csv'):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(PANEL_COLUMNS)
+            for marker, antibodies in panel.items():
+                for ab in antibodies:
+                    writer.writerow([marker, ab['name'], ab['ex'], ab['em']])
+        return
+    with open(path, 'w') as f:
+        json.dump(panel, f, indent=2)
+
+
+# ------------------------------------------------------------------- #
+# Instrument configurations
+# ------------------------------------------------------------------- #
+def load_instrument(path):
+    """
+    Loads an instrument as {'lasers': {laser: {detector: {'center', 'width'}}}}.
+    JSON files may omit the top-level 'lasers' key; laser keys are read back
+    as numbers. CSV files have one detector per row with `laser`,
+    `detector`, `center` and `width` columns.
+    """
+    lasers = {}
+    if path.lower().endswith('.csv'):
+        for row in read_csv_rows(path, INSTRUMENT_COLUMNS):
+            lasers.setdefault(parse_number(row['laser']), {})[row['detector']] = {
+                'center': parse_number(row['center']), 'width': parse_number(row['width'])
+            }
+        return {'lasers': lasers}
+
+    with open(path) as f:
+        data = json.load(f)
+    for laser, detectors in data.get('lasers', data).items():
+        lasers[parse_number(laser)] = {
+            name: {'center': parse_number(props['center']), 'width': parse_number(props['width'])}
+            for name, props in detectors.items()
+        }
+    return {'lasers': lasers}
+
+
+def save_instrument(instrument, path):
+    """Writes an instrument as JSON or CSV, following the extension."""
+    if path.lower().endswith('.csv'):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(INSTRUMENT_COLUMNS)
+            for laser, detectors in instrument['lasers'].items():
+                for name, props in detectors.items():
+                    writer.writerow([laser, name, props['center'], props['width']])
+        return
+    with open(path, 'w') as f:
+        json.dump({'lasers': {str(laser): detectors for laser, detectors in instrument['lasers'].items()}}, f, indent=2)
+
+
+def list_definitions(path, extensions=PANEL_EXTENSIONS):
+    """Returns the files with one of `extensions` in a directory (sorted), or `[path]` for a single file."""
+    if os.path.isfile(path):
+        return [path]
+    return sorted(
+        os.path.join(path, name) for name in os.listdir(path)
+        if name.lower().endswith(extensions)
+    )
@@ -0,0 +1,118 @@
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+
+# ------------------------------------------------------------------- #
+# Table models bound directly to the GUI's in-memory data
+# ------------------------------------------------------------------- #
+class AntibodyTableModel(QAbstractTableModel):
+    """
+    Exposes the antibody list of one marker (a list inside `panel_data`).
+    Edits go through `add_antibody`/`remove_antibody`, which update the list
+    in place and emit row insert/remove signals instead of resetting the view.
+    """
+    HEADERS = ['Name', 'Ex (nm)', 'Em (nm)']
+    KEYS = ['name', 'ex', 'em']
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.marker = None
+        self.antibodies = []
+
+    def set_antibodies(self, marker, antibodies):
+        """Binds the model to `antibodies`, the list stored for `marker`."""
+        self.beginResetModel()
+        self.marker = marker
+        self.antibodies = antibodies if antibodies is not None else []
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.antibodies)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        # Raw values keep numeric columns sorting numerically
+        return self.antibodies[index.row()][self.KEYS[index.column()]]
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def add_antibody(self, antibody):
+        row = len(self.antibodies)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.antibodies.append(antibody)
+        self.endInsertRows()
+
+    def remove_antibody(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self.antibodies.pop(row)
+        self.endRemoveRows()
+
+
+class DetectorTableModel(QAbstractTableModel):
+    """
+    Exposes the detectors of one laser (a {name: {'center', 'width'}} dict
+    inside `instrument_data`), editing the dict in place with incremental
+    row signals.
+    """
+    HEADERS = ['Name', 'Center (nm)', 'Width (nm)']
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.laser = None
+        self.detectors = {}
+        self.names = []
+
+    def set_detectors(self, laser, detectors):
+        """Binds the model to `detectors`, the dict stored for `laser`."""
+        self.beginResetModel()
+        self.laser = laser
+        self.detectors = detectors if detectors is not None else {}
+        self.names = list(self.detectors.keys())
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.names)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        name = self.names[index.row()]
+        if index.column() == 0:
+            return name
+        props = self.detectors[name]
+        return props['center'] if index.column() == 1 else props['width']
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def name_at(self, row):
+        return self.names[row]
+
+    def set_detector(self, name, props):
+        """Adds a detector, or updates it in place when the name already exists."""
+        if name in self.detectors:
+            row = self.names.index(name)
+            self.detectors[name] = props
+            self.dataChanged.emit(self.index(row, 1), self.index(row, 2))
+            return
+        row = len(self.names)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.detectors[name] = props
+        self.names.append(name)
+        self.endInsertRows()
+
+    def remove_detector(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.detectors[self.names.pop(row)]
+        self.endRemoveRows()
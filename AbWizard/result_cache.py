@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+
+# Part of every fingerprint; bump it when the result format or the solver's
+# answers change, so entries written by older versions stop matching
+CACHE_VERSION = 1
+
+
+# ------------------------------------------------------------------- #
+# Problem fingerprints
+# ------------------------------------------------------------------- #
+def normalize(value):
+    """
+    Canonical form of a definition for hashing: numbers become floats (so
+    495, 495.0 and a laser key read back as '488' all agree) and mappings
+    are sorted by key when serialized. List order is kept.
+    """
+    if isinstance(value, dict):
+        return {normalize_key(key): normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize(item) for item in value]
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+def normalize_key(key):
+    try:
+        return repr(float(key))
+    except (TypeError, ValueError):
+        return str(key)
+
+
+def fingerprint(antibody_panel, instrument_config, options=None):
+    """Hex SHA-256 of the normalized panel, instrument and run options."""
+    payload = json.dumps(
+        {
+            'version': CACHE_VERSION,
+            'panel': normalize(antibody_panel),
+            'instrument': normalize(instrument_config),
+            'options': normalize(options or {}),
+        },
+        sort_keys=True, separators=(',', ':')
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+# ------------------------------------------------------------------- #
+# Compact result encoding
+# ------------------------------------------------------------------- #
+# Panels of one run share their antibody rows, so they are stored as lists
+# of indices into a single row table instead of repeating every row.
+
+def pack_results(results):
+    rows, row_ids = [], {}
+
+    def panel_ids(panel):
+        ids = []
+        for row in panel:
+            row_id = row_ids.get(id(row))
+            if row_id is None:
+                row_id = row_ids[id(row)] = len(rows)
+                rows.append(row)
+            ids.append(row_id)
+        return ids
+
+    packed = []
+    for package in results:
+        package = dict(package)
+        if 'solutions' in package:
+            package['solutions'] = [panel_ids(panel) for panel in package['solutions']]
+        if 'panel' in package:
+            package['panel'] = panel_ids(package['panel'])
+        packed.append(package)
+    return {'rows': rows, 'results': packed}
+
+
+def unpack_results(data):
+    rows = data['rows']
+    results = data['results']
+    for package in results:
+        if 'solutions' in package:
+            package['solutions'] = [[rows[i] for i in ids] for ids in package['solutions']]
+        if 'panel' in package:
+            package['panel'] = [rows[i] for i in package['panel']]
+    return results
+
+
+def file_stamp(path):
+    """Size and modification time of a file, or None when it is missing."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+# ------------------------------------------------------------------- #
+# SQLite result store
+# ------------------------------------------------------------------- #
+class ResultCache:
+    """
+    Solved Wizard results keyed by fingerprint, stored as compressed JSON in a
+    SQLite file, along with the result file they were last written to
+    (and its size and mtime, so a file changed since is not handed back).
+    Large results can be stored `file_only`: the packages without their
+    panels, which are only useful while that result file is unchanged.
+    When the stored data grows past `max_bytes`, the least recently used
+    entries are evicted. Several processes may share one file.
+    """
+
+    def __init__(self, path, max_bytes=256 * 2**20):
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, "
+            "output_path TEXT, output_stamp TEXT, last_used REAL NOT NULL)"
+        )
+        self.connection.commit()
+
+    def get(self, key):
+        """
+        Returns `(results, output_path, file_only)` for `key`, or None when
+        it is not cached. `output_path` is None unless the result file is
+        unchanged; a `file_only` entry whose file changed counts as missing.
+        """
+        row = self.connection.execute(
+            "SELECT data, output_path, output_stamp FROM results WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        with self.connection:
+            self.connection.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        data, output_path, output_stamp = row
+        if output_path is not None and file_stamp(output_path) != output_stamp:
+            output_path = None
+        payload = json.loads(zlib.decompress(data).decode('utf-8'))
+        file_only = payload.get('file_only', False)
+        if file_only and output_path is None:
+            return None
+        return unpack_results(payload), output_path, file_only
+
+    def put(self, key, results, output_path=None, file_only=False):
+        """
+        Stores a list of Wizard result packages; entries larger than the
+        whole cache are skipped. Returns whether the entry was stored.
+        """
+        payload = pack_results(results)
+        payload['file_only'] = file_only
+        data = zlib.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+        if len(data) > self.max_bytes:
+            return False
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO results (key, data, size, output_path, output_stamp, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, data, len(data), output_path, file_stamp(output_path) if output_path else None, time.time())
+            )
+        self.evict()
+        return True
+
+    def set_output_path(self, key, output_path):
+        with self.connection:
+            self.connection.execute(
+                "UPDATE results SET output_path = ?, output_stamp = ? WHERE key = ?",
+                (output_path, file_stamp(output_path), key)
+            )
+
+    def evict(self):
+        """Deletes least recently used entries until the stored data fits in `max_bytes`."""
+        with self.connection:
+            total = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for key, size in self.connection.execute("SELECT key, size FROM results ORDER BY last_used").fetchall():
+                self.connection.execute("DELETE FROM results WHERE key = ?", (key,))
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def clear(self):
+        with self.connection:
+            self.connection.execute("DELETE FROM results")
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,100 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from wizard import Wizard
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_HEADERS = ['Rank', 'Instrument', 'Max_Markers', 'Markers_Used', 'Markers_Omitted', 'Options']
+# Seconds between two checks of stop_event while waiting on a pool process
+STOP_POLL_INTERVAL = 0.1
+
+
+# ------------------------------------------------------------------- #
+# One panel against many instruments
+# ------------------------------------------------------------------- #
+def screen_instrument(antibody_panel, antibody_arrays, name, instrument_config, excitation_tolerance=None):
+    """
+    Maximum number of markers of the panel on one instrument, with one
+    witness panel. `options` counts the (antibody, slot) alternatives left
+    after filtering, which breaks ties between instruments.
+    """
+    wizard = Wizard(antibody_panel, instrument_config, excitation_tolerance)
+    compatible_panel = wizard.prepare_and_filter_panel(antibody_arrays)
+    num_markers, witness = wizard.find_max_panel(compatible_panel) if compatible_panel else (0, [])
+    markers_used = [ab['marker'] for ab in witness]
+    return {
+        'instrument': name,
+        'max_markers': num_markers,
+        'markers_used': markers_used,
+        'markers_omitted': [m for m in antibody_panel if m not in markers_used],
+        'options': sum(len(abs_) for abs_ in compatible_panel.values()),
+        'panel': witness,
+    }
+
+
+_pool_panel = None
+
+
+def _init_screen_worker(antibody_panel, antibody_arrays, excitation_tolerance):
+    global _pool_panel
+    _pool_panel = (antibody_panel, antibody_arrays, excitation_tolerance)
+
+
+def _screen_in_worker(item):
+    name, instrument_config = item
+    antibody_panel, antibody_arrays, excitation_tolerance = _pool_panel
+    return screen_instrument(antibody_panel, antibody_arrays, name, instrument_config, excitation_tolerance)
+
+
+def screen_instruments(antibody_panel, instruments, workers=None, excitation_tolerance=None, mp_context=None,
+                       stop_event=None):
+    """
+    Solves one panel against several instruments, given as {name:
+    instrument_config}. The antibodies are flattened into arrays once and
+    shared by every instrument (sent once per process with `workers`,
+    started with the multiprocessing `mp_context` when given). Returns one
+    row per instrument, ranked by maximum marker count, then by number of
+    options, or None when `stop_event` is set first; instruments not
+    started by then are dropped and running ones are not waited for.
+    """
+    antibody_arrays = Wizard(antibody_panel, {'lasers': {}}).build_antibody_arrays()
+    items = list(instruments.items())
+    rows = []
+    if workers is not None and workers > 1 and len(items) > 1:
+        executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=mp_context, initializer=_init_screen_worker,
+            initargs=(antibody_panel, antibody_arrays, excitation_tolerance)
+        )
+        try:
+            futures = [executor.submit(_screen_in_worker, item) for item in items]
+            for future in futures:
+                while stop_event is not None and not wait([future], timeout=STOP_POLL_INTERVAL).done:
+                    if stop_event.is_set():
+                        return None
+                rows.append(future.result())
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    else:
+        for name, config in items:
+            if stop_event is not None and stop_event.is_set():
+                return None
+            rows.append(screen_instrument(antibody_panel, antibody_arrays, name, config, excitation_tolerance))
+
+    # Stable sort: instruments that tie keep their given order
+    rows.sort(key=lambda row: (-row['max_markers'], -row['options']))
+    for rank, row in enumerate(rows, 1):
+        row['rank'] = rank
+    if rows:
+        best = rows[0]
+        logger.info(f"Best instrument: {best['instrument']} ({best['max_markers']} of {len(antibody_panel)} markers)")
+    return rows
+
+
+def screening_rows(rows):
+    """Flattens `screen_instruments` output into SUMMARY_HEADERS rows, e.g. for a CSV or table."""
+    return [
+        [row['rank'], row['instrument'], row['max_markers'], ', '.join(row['markers_used']),
+         ', '.join(row['markers_omitted']), row['options']]
+        for row in rows
+    ]
@@ -0,0 +1,189 @@
+from wizard import Wizard
+
+
+# ------------------------------------------------------------------- #
+# Incremental solver session
+# ------------------------------------------------------------------- #
+class SolverSession:
+    """
+    Keeps the filtered marker -> slot graph and a maximum matching alive
+    while the panel and instrument are edited, so the maximum marker count
+    and a witness panel are known again in milliseconds after each edit.
+
+    `antibody_panel` and `instrument_config` are shared with the caller, who
+    edits them in place and then reports the edit through one of the
+    `*_added`/`*_removed`/`laser_changed` methods. Only the touched markers
+    or laser are re-filtered, and the matching is repaired with augmenting
+    paths from the unmatched markers instead of being rebuilt.
+    """
+
+    def __init__(self, antibody_panel, instrument_config, excitation_tolerance=None):
+        self.wizard = Wizard(antibody_panel, instrument_config, excitation_tolerance)
+        # marker -> [(antibody, [compatible slots]), ...] in panel order
+        self.candidates = {}
+        # marker -> {slot: number of its antibodies that can use it}
+        self.graph = {}
+        self.matching = {}
+        self.slot_owner = {}
+        self.rebuild()
+
+    @property
+    def antibody_panel(self):
+        return self.wizard.antibody_panel
+
+    @property
+    def instrument_config(self):
+        return self.wizard.instrument_config
+
+    def rebuild(self):
+        """Re-filters everything and recomputes the matching from scratch."""
+        self.wizard.invalidate_detector_indexes()
+        self.candidates = {}
+        self.graph = {}
+        self.matching = {}
+        self.slot_owner = {}
+        for marker in self.antibody_panel:
+            self.refilter_marker(marker)
+        self.repair()
+
+    # --- Edits --------------------------------------------------------
+
+    def antibody_added(self, marker, antibody):
+        slots = self.wizard.get_compatible_slots(antibody)
+        self.candidates.setdefault(marker, []).append((antibody, slots))
+        marker_slots = self.graph.setdefault(marker, {})
+        for slot in slots:
+            marker_slots[slot] = marker_slots.get(slot, 0) + 1
+        # A new slot for a matched marker can still free a path for an unmatched one
+        if slots and len(self.matching) < len(self.graph):
+            self.repair()
+
+    def antibody_removed(self, marker, antibody):
+        entries = self.candidates.get(marker, [])
+        for i, (candidate, slots) in enumerate(entries):
+            if candidate is antibody:
+                del entries[i]
+                break
+        else:
+            return
+        marker_slots = self.graph[marker]
+        for slot in slots:
+            marker_slots[slot] -= 1
+            if marker_slots[slot] == 0:
+                del marker_slots[slot]
+        if self.matching.get(marker) not in marker_slots:
+            self.unmatch(marker)
+            self.repair()
+
+    def marker_added(self, marker):
+        self.refilter_marker(marker)
+        self.repair()
+
+    def marker_removed(self, marker):
+        self.unmatch(marker)
+        self.candidates.pop(marker, None)
+        self.graph.pop(marker, None)
+        # The freed slot may let an unmatched marker in
+        self.repair()
+
+    def excitation_tolerance_changed(self, excitation_tolerance):
+        """Every antibody's lasers may change, so the whole graph is rebuilt."""
+        self.wizard.excitation_tolerance = excitation_tolerance
+        self.rebuild()
+
+    def laser_changed(self, laser):
+        """Call after adding or removing `laser`, or editing any of its detectors."""
+        self.wizard.invalidate_detector_indexes()
+        lasers = list(self.instrument_config.get('lasers', {}).keys())
+        laser_order = {l: i for i, l in enumerate(lasers)}
+        for marker, entries in self.candidates.items():
+            for i, (antibody, slots) in enumerate(entries):
+                # Only the slots on the edited laser can have changed
+                kept = [slot for slot in slots if slot[0] != laser]
+                if laser in laser_order:
+                    kept.extend(self.wizard.get_compatible_slots(antibody, [laser]))
+                    kept.sort(key=lambda slot: laser_order[slot[0]])
+                entries[i] = (antibody, kept)
+            self.graph[marker] = self.count_slots(entries)
+            if marker in self.matching and self.matching[marker] not in self.graph[marker]:
+                self.unmatch(marker)
+        self.repair()
+
+    # --- Results ------------------------------------------------------
+
+    def max_markers(self):
+        return len(self.matching)
+
+    def witness(self):
+        """One panel using `max_markers()` markers, as `Wizard.find_max_panel` builds it."""
+        panel = []
+        for marker in self.antibody_panel:
+            slot = self.matching.get(marker)
+            if slot is None:
+                continue
+            for antibody, slots in self.candidates[marker]:
+                if slot in slots:
+                    panel.append({'marker': marker, **antibody, 'detector_name': slot[1], 'used_laser': slot[0]})
+                    break
+        return panel
+
+    def witness_results(self):
+        """The witness packaged like `Wizard.find_witness_solution` results, or None."""
+        witness = self.witness()
+        if not witness:
+            return None
+        markers_used = [ab['marker'] for ab in witness]
+        return [self.wizard.result_package(markers_used, solutions=[witness], num_solutions=1)]
+
+    def compatible_panel(self):
+        """The current filtered panel, as `Wizard.prepare_and_filter_panel` returns it."""
+        filtered_panel = {}
+        for marker, entries in self.candidates.items():
+            for antibody, slots in entries:
+                for laser, detector_name in slots:
+                    valid_ab = antibody.copy()
+                    valid_ab['detector_name'] = detector_name
+                    valid_ab['used_laser'] = laser
+                    filtered_panel.setdefault(marker, []).append(valid_ab)
+        return filtered_panel
+
+    # --- Matching maintenance -----------------------------------------
+
+    def refilter_marker(self, marker):
+        entries = [(ab, self.wizard.get_compatible_slots(ab)) for ab in self.antibody_panel.get(marker, [])]
+        self.candidates[marker] = entries
+        self.graph[marker] = self.count_slots(entries)
+
+    def count_slots(self, entries):
+        marker_slots = {}
+        for _, slots in entries:
+            for slot in slots:
+                marker_slots[slot] = marker_slots.get(slot, 0) + 1
+        return marker_slots
+
+    def unmatch(self, marker):
+        slot = self.matching.pop(marker, None)
+        if slot is not None and self.slot_owner.get(slot) == marker:
+            del self.slot_owner[slot]
+
+    def augment(self, marker, visited):
+        # Kuhn-style search for an alternating path ending in a free slot
+        for slot in self.graph[marker]:
+            if slot in visited:
+                continue
+            visited.add(slot)
+            owner = self.slot_owner.get(slot)
+            if owner is None or self.augment(owner, visited):
+                self.matching[marker] = slot
+                self.slot_owner[slot] = marker
+                return True
+        return False
+
+    def repair(self):
+        """Augments from unmatched markers until no augmenting path is left (Berge)."""
+        improved = True
+        while improved:
+            improved = False
+            for marker in self.graph:
+                if marker not in self.matching and self.augment(marker, set()):
+                    improved = True
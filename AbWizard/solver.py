@@ -0,0 +1,730 @@
+import itertools
+import math
+import multiprocessing
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import numpy as np
+
+from stats import SolverStats
+
+# ------------------------------------------------------------------- #
+# Marker -> (laser, detector) slot graph
+# ------------------------------------------------------------------- #
+def build_slot_graph(compatible_panel, markers=None):
+    """Maps each marker to the distinct (laser, detector) slots its antibodies can occupy."""
+    if markers is None:
+        markers = list(compatible_panel.keys())
+    graph = {}
+    for marker in markers:
+        slots = []
+        for ab in compatible_panel.get(marker, []):
+            slot = (ab['used_laser'], ab['detector_name'])
+            if slot not in slots:
+                slots.append(slot)
+        graph[marker] = slots
+    return graph
+
+
+# ------------------------------------------------------------------- #
+# Hopcroft-Karp maximum bipartite matching
+# ------------------------------------------------------------------- #
+def hopcroft_karp(graph):
+    """
+    Finds a maximum matching between markers and instrument slots.
+    `graph` maps each marker to the slots it can use. Returns a dict
+    {marker: slot} for every matched marker. Runs in O(E * sqrt(V)).
+    """
+    match_marker = {marker: None for marker in graph}
+    match_slot = {}
+    INF = float('inf')
+
+    def bfs():
+        # Layer the free markers and grow alternating paths from them
+        dist = {}
+        queue = deque()
+        for marker in graph:
+            if match_marker[marker] is None:
+                dist[marker] = 0
+                queue.append(marker)
+            else:
+                dist[marker] = INF
+        found_free_slot = False
+        while queue:
+            marker = queue.popleft()
+            for slot in graph[marker]:
+                owner = match_slot.get(slot)
+                if owner is None:
+                    found_free_slot = True
+                elif dist[owner] == INF:
+                    dist[owner] = dist[marker] + 1
+                    queue.append(owner)
+        return found_free_slot, dist
+
+    def dfs(marker, dist):
+        for slot in graph[marker]:
+            owner = match_slot.get(slot)
+            if owner is None or (dist[owner] == dist[marker] + 1 and dfs(owner, dist)):
+                match_marker[marker] = slot
+                match_slot[slot] = marker
+                return True
+        # Dead end: drop this marker from the current phase
+        dist[marker] = INF
+        return False
+
+    while True:
+        found_free_slot, dist = bfs()
+        if not found_free_slot:
+            break
+        for marker in graph:
+            if match_marker[marker] is None:
+                dfs(marker, dist)
+
+    return {marker: slot for marker, slot in match_marker.items() if slot is not None}
+
+
+# ------------------------------------------------------------------- #
+# Memoized sub-problems
+# ------------------------------------------------------------------- #
+class SubproblemCache:
+    """
+    Bounded LRU over sub-problems of a CompiledPanel, keyed on
+    (marker subset bitmask, occupied slot bitmask). A value is the number of
+    assignments of the subset avoiding those slots, FEASIBLE when only
+    feasibility was needed, or 0 when no assignment exists.
+
+    Marker subsets that can never be placed together (fewer slots than
+    markers) are also kept, so any combination containing one is skipped
+    without a search.
+    """
+    FEASIBLE = -1
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.infeasible_sets = []
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def add_infeasible_set(self, marker_mask):
+        if self.contains_infeasible_set(marker_mask):
+            return
+        # Keep only minimal sets; the new one supersedes its supersets
+        self.infeasible_sets = [m for m in self.infeasible_sets if m & marker_mask != marker_mask]
+        self.infeasible_sets.append(marker_mask)
+        if len(self.infeasible_sets) > self.max_entries:
+            self.infeasible_sets.pop(0)
+
+    def contains_infeasible_set(self, marker_mask):
+        return any(m & marker_mask == m for m in self.infeasible_sets)
+
+
+# ------------------------------------------------------------------- #
+# Integer-encoded panel for the backtracking search
+# ------------------------------------------------------------------- #
+class CompiledPanel:
+    """
+    Compiled-once view of a filtered panel. Markers, antibodies and
+    (laser, detector) slots are interned to small integers and every
+    candidate antibody carries the bit of the slot it occupies, so the
+    search only touches ints and panel lists are built for complete panels.
+    """
+
+    # How many search nodes to visit between two deadline / stop-request checks
+    STOP_CHECK_INTERVAL = 1024
+
+    def __init__(self, compatible_panel, markers=None):
+        if markers is None:
+            markers = list(compatible_panel.keys())
+        self.markers = list(markers)
+        self.marker_index = {marker: i for i, marker in enumerate(self.markers)}
+        self.slots = []        # slot id -> (laser, detector_name)
+        self.slot_index = {}   # (laser, detector_name) -> slot id
+        self.rows = []         # antibody id -> {'marker': marker, **antibody} output row
+        self.row_slots = []    # antibody id -> slot id
+        # Per marker: parallel lists of candidate antibody ids and slot bits
+        self.candidate_ids = []
+        self.candidate_bits = []
+
+        for marker in self.markers:
+            ids, bits = [], []
+            for ab in compatible_panel.get(marker, []):
+                slot = (ab['used_laser'], ab['detector_name'])
+                if slot not in self.slot_index:
+                    self.slot_index[slot] = len(self.slots)
+                    self.slots.append(slot)
+                ids.append(len(self.rows))
+                bits.append(1 << self.slot_index[slot])
+                self.rows.append({'marker': marker, **ab})
+                self.row_slots.append(self.slot_index[slot])
+            self.candidate_ids.append(ids)
+            self.candidate_bits.append(bits)
+
+        # Per marker: its slot classes, i.e. the antibodies that share a slot
+        # and are therefore interchangeable, as parallel lists of id lists and
+        # slot bits (in order of first appearance); the union of its slot
+        # bits; and (slot bit, class size) groups for counting
+        self.slot_class_members = []
+        self.slot_class_bits = []
+        self.marker_slot_masks = []
+        self.slot_groups = []
+        for ids, bits in zip(self.candidate_ids, self.candidate_bits):
+            classes = {}
+            for ab_id, bit in zip(ids, bits):
+                classes.setdefault(bit, []).append(ab_id)
+            self.slot_class_members.append(list(classes.values()))
+            self.slot_class_bits.append(list(classes))
+            self.slot_groups.append([(bit, len(members)) for bit, members in classes.items()])
+            self.marker_slot_masks.append(sum(classes))
+
+    def marker_indices(self, markers):
+        return [self.marker_index[marker] for marker in markers]
+
+    def marker_mask(self, marker_indices):
+        mask = 0
+        for m in marker_indices:
+            mask |= 1 << m
+        return mask
+
+    def subproblem_key(self, marker_mask, used):
+        # Slots none of the markers can use do not change the answer
+        reachable = 0
+        remaining = marker_mask
+        while remaining:
+            low = remaining & -remaining
+            reachable |= self.marker_slot_masks[low.bit_length() - 1]
+            remaining ^= low
+        return marker_mask, used & reachable
+
+    def hall_violator(self, marker_mask, used=0):
+        """
+        Matches the markers of `marker_mask` to distinct free slots. Returns 0
+        when all of them fit, otherwise the mask of a subset that has fewer
+        free slots than markers (Hall's condition fails on it).
+        """
+        slot_owner = {}
+
+        def augment(m, visited):
+            free = self.marker_slot_masks[m] & ~used
+            while free:
+                bit = free & -free
+                free ^= bit
+                if visited[0] & bit:
+                    continue
+                visited[0] |= bit
+                owner = slot_owner.get(bit)
+                if owner is None or augment(owner, visited):
+                    slot_owner[bit] = m
+                    return True
+            return False
+
+        remaining = marker_mask
+        while remaining:
+            low = remaining & -remaining
+            remaining ^= low
+            m = low.bit_length() - 1
+            visited = [0]
+            if not augment(m, visited):
+                # m plus the owners of every slot it could reach through alternating paths
+                violator = low
+                for bit, owner in slot_owner.items():
+                    if visited[0] & bit:
+                        violator |= 1 << owner
+                return violator
+        return 0
+
+    def is_completable(self, marker_mask, used=0, cache=None):
+        """True when every marker of `marker_mask` can still get a slot outside `used`."""
+        key = self.subproblem_key(marker_mask, used)
+        if cache is not None:
+            value = cache.get(key)
+            if value is not None:
+                return value != 0
+        violator = self.hall_violator(*key)
+        if cache is not None:
+            cache.put(key, 0 if violator else SubproblemCache.FEASIBLE)
+            if violator and not key[1]:
+                cache.add_infeasible_set(violator)
+        return not violator
+
+    def count_assignments(self, marker_mask, used=0, cache=None):
+        """
+        Counts the assignments of the markers of `marker_mask` to antibodies
+        with distinct slots outside `used`, without building any of them.
+        Antibodies sharing a slot are counted together, and every
+        (marker subset, free slots) sub-problem is solved once per `cache`.
+        """
+        if cache is None:
+            cache = SubproblemCache()
+        return self._count(marker_mask, used, cache)
+
+    def _count(self, marker_mask, used, cache):
+        if not marker_mask:
+            return 1
+        key = self.subproblem_key(marker_mask, used)
+        value = cache.get(key)
+        if value is not None and value != SubproblemCache.FEASIBLE:
+            return value
+        low = marker_mask & -marker_mask
+        rest = marker_mask ^ low
+        total = 0
+        for bit, multiplicity in self.slot_groups[low.bit_length() - 1]:
+            if not bit & used:
+                total += multiplicity * self._count(rest, used | bit, cache)
+        cache.put(key, total)
+        return total
+
+    def iter_assignments(self, marker_indices, deadline=None, used=0, stop_event=None, cache=None, stats=None,
+                         expand=True, resume=None):
+        """
+        Yields a tuple of antibody ids (one per entry of `marker_indices`) for
+        every assignment with pairwise distinct slots. The search branches on
+        slot classes rather than antibodies, and each complete slot-level
+        assignment is expanded into its panels on the way out; when no two
+        antibodies of a marker share a slot, the order is that of the
+        recursive search. Occupied slots are held in a single int bitmask,
+        which can be seeded through `used`. The search ends early once the
+        `time.monotonic()` value `deadline` passes or `stop_event` is set.
+        With a SubproblemCache, a candidate is skipped without descending when
+        the markers after it can no longer all be placed. Node and backtrack
+        counts are added to `stats` (a SolverStats) when the search ends.
+        With `expand=False`, see `iter_slot_assignments`. `resume` takes the
+        `slot_position` of a slot-level assignment yielded by an earlier
+        search over the same markers and `used`, and continues after it.
+        """
+        members = [self.slot_class_members[m] for m in marker_indices]
+        bits = [self.slot_class_bits[m] for m in marker_indices]
+        n = len(members)
+        if n == 0:
+            yield ()
+            return
+        if not all(members):
+            return
+        if deadline is not None and time.monotonic() >= deadline:
+            return
+        if cache is not None and n > 1 and not self.is_completable(self.marker_mask(marker_indices), used, cache):
+            return
+
+        last = n - 1
+        last_options = list(zip(members[last], bits[last]))
+        if cache is not None:
+            # suffix_masks[d] / suffix_slots[d]: markers at depth >= d and the slots they can use
+            suffix_masks = [0] * (n + 1)
+            suffix_slots = [0] * (n + 1)
+            for d in range(n - 1, -1, -1):
+                suffix_masks[d] = suffix_masks[d + 1] | (1 << marker_indices[d])
+                suffix_slots[d] = suffix_slots[d + 1] | self.marker_slot_masks[marker_indices[d]]
+            entries = cache.entries
+        chosen = [None] * n  # antibody ids of the slot class picked at each depth
+        first = [0] * n      # first antibody id of each picked class
+        weight = [1] * n     # panels per slot-level assignment of the depths above
+        taken = [0] * n      # slot bit held at each depth
+        position = [0] * n   # next candidate to try at each depth
+        started = [0] * n    # assignments yielded before entering each depth
+        partial = [False] * n  # depth entered by `resume`, so its count is incomplete
+        found = 0   # panels, i.e. slot-level assignments weighted by their class sizes
+        leaves = 0  # slot-level assignments
+        depth = 0
+        nodes = 0
+        backtracks = 0
+        last_start = 0
+        if resume is not None:
+            # Re-enter the path of the given assignment; its earlier siblings are done
+            for d in range(last):
+                i = resume[d]
+                chosen[d] = members[d][i]
+                first[d] = chosen[d][0]
+                taken[d] = bits[d][i]
+                used |= bits[d][i]
+                position[d] = i + 1
+                weight[d + 1] = weight[d] * len(chosen[d])
+                partial[d] = True
+            depth = last
+            last_start = resume[last] + 1
+        try:
+            while depth >= 0:
+                if depth == last:
+                    # Leaves dominate the tree, so the last marker is a flat scan
+                    prefix = weight[last]
+                    options = last_options
+                    if last_start:
+                        options = last_options[last_start:]
+                        last_start = 0
+                    for class_ids, bit in options:
+                        if not bit & used:
+                            found += prefix * len(class_ids)
+                            leaves += 1
+                            chosen[last] = class_ids
+                            if not expand:
+                                yield tuple(chosen)
+                            elif prefix == 1 and len(class_ids) == 1:
+                                first[last] = class_ids[0]
+                                yield tuple(first)
+                            else:
+                                yield from itertools.product(*chosen)
+                    depth -= 1
+                    backtracks += 1
+                    continue
+
+                # Release the slot picked previously at this depth
+                used ^= taken[depth]
+                taken[depth] = 0
+
+                options = bits[depth]
+                i = position[depth]
+                count = len(options)
+                if cache is not None and depth < last - 2:
+                    below, below_slots = suffix_masks[depth + 1], suffix_slots[depth + 1]
+                    # Skip candidates whose remaining sub-problem is known to be dead
+                    while i < count and (options[i] & used or entries.get((below, (used | options[i]) & below_slots)) == 0):
+                        i += 1
+                else:
+                    while i < count and options[i] & used:
+                        i += 1
+                if i == count:
+                    # Exhausted this depth: backtrack
+                    if cache is not None and 0 < depth < last - 1 and not partial[depth]:
+                        # Every assignment below this node has been yielded, so the count is exact;
+                        # the panels found were multiplied by the class sizes picked above it
+                        cache.put(
+                            (suffix_masks[depth], used & suffix_slots[depth]), (found - started[depth]) // weight[depth]
+                        )
+                    position[depth] = 0
+                    partial[depth] = False
+                    depth -= 1
+                    backtracks += 1
+                    continue
+
+                position[depth] = i + 1
+                class_ids = members[depth][i]
+                chosen[depth] = class_ids
+                first[depth] = class_ids[0]
+                taken[depth] = options[i]
+                used |= options[i]
+                depth += 1
+                weight[depth] = weight[depth - 1] * len(class_ids)
+                started[depth] = found
+
+                nodes += 1
+                if nodes % self.STOP_CHECK_INTERVAL == 0:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        return
+                    if stop_event is not None and stop_event.is_set():
+                        return
+        finally:
+            if stats is not None:
+                # Slot-level leaves are counted as nodes too
+                stats.nodes += nodes + leaves
+                stats.backtracks += backtracks
+
+    def iter_slot_assignments(self, marker_indices, deadline=None, used=0, stop_event=None, cache=None, stats=None,
+                              resume=None):
+        """
+        Same search as `iter_assignments`, but interchangeable antibodies are
+        not expanded: yields a tuple with one list of antibody ids per marker,
+        all of which sit in the same slot. Each result stands for the product
+        of its list lengths panels.
+        """
+        return self.iter_assignments(marker_indices, deadline, used, stop_event, cache, stats, expand=False,
+                                     resume=resume)
+
+    def slot_position(self, marker_indices, slot_assignment):
+        """Index of each picked slot class within its marker, as `iter_assignments(resume=...)` takes it."""
+        return tuple(
+            self.slot_class_bits[m].index(1 << self.row_slots[class_ids[0]])
+            for m, class_ids in zip(marker_indices, slot_assignment)
+        )
+
+    def build_panel(self, assignment):
+        """Expands a tuple of antibody ids into the panel dicts used by the rest of the app."""
+        # Rows are shared between panels, as they are in the recursive search
+        return [self.rows[ab_id] for ab_id in assignment]
+
+    def assignment_for(self, panel):
+        """
+        Maps panel dicts back to antibody ids. Antibodies of one marker in the
+        same slot are interchangeable here, so the first of them is used.
+        """
+        assignment = []
+        for ab in panel:
+            slot = self.slot_index[(ab['used_laser'], ab['detector_name'])]
+            candidates = self.candidate_ids[self.marker_index[ab['marker']]]
+            assignment.append(next(ab_id for ab_id in candidates if self.row_slots[ab_id] == slot))
+        return tuple(assignment)
+
+
+# ------------------------------------------------------------------- #
+# Process pool search
+# ------------------------------------------------------------------- #
+_pool_panel = None
+_pool_cache = None
+_pool_stop = None
+
+# Slot-level assignments a worker returns per task; a branch with more is
+# continued by a follow-up task, so no worker holds a whole branch
+PARALLEL_CHUNK_SIZE = 1024
+# Seconds between two checks of the caller's stop_event while waiting on a worker
+STOP_POLL_INTERVAL = 0.1
+
+
+def _init_pool_worker(compiled, cache_size=None, stop=None):
+    global _pool_panel, _pool_cache, _pool_stop
+    _pool_panel = compiled
+    _pool_cache = SubproblemCache(cache_size) if cache_size else None
+    _pool_stop = stop
+
+
+def _solve_branch(task):
+    """
+    Solves one chunk of a first-level branch, where the first marker is
+    pinned to one of its slot classes. Stops after PARALLEL_CHUNK_SIZE
+    slot-level assignments or once they stand for `limit` panels, and
+    returns them with the position to resume from (None when the branch is
+    done) and the chunk's node and backtrack counts.
+    """
+    marker_indices, option, limit, deadline, resume = task
+    first = marker_indices[0]
+    rest = marker_indices[1:]
+    bit = _pool_panel.slot_class_bits[first][option]
+    width = len(_pool_panel.slot_class_members[first][option])
+    stats = SolverStats()
+    search = _pool_panel.iter_slot_assignments(
+        rest, deadline, used=bit, stop_event=_pool_stop, cache=_pool_cache, stats=stats, resume=resume
+    )
+    chunk, panels, next_resume = [], 0, None
+    try:
+        for slot_assignment in search:
+            chunk.append(slot_assignment)
+            panels += width * math.prod(len(class_ids) for class_ids in slot_assignment)
+            if len(chunk) >= PARALLEL_CHUNK_SIZE or (limit is not None and panels >= limit):
+                next_resume = _pool_panel.slot_position(rest, slot_assignment)
+                break
+    finally:
+        # Closing flushes the counts of a chunk cut short
+        search.close()
+    if limit is not None and panels >= limit:
+        next_resume = None
+    # The pinned first marker is one more node, counted once per branch
+    return chunk, next_resume, stats.nodes + (resume is None), stats.backtracks
+
+
+def iter_parallel_assignments(compiled, jobs, workers, max_per_combination=None, deadline=None, cache_size=None,
+                              stats=None, max_solutions=None, stop_event=None):
+    """
+    Takes `(key, marker_indices)` jobs and yields `(key, assignment)` for every
+    assignment of every job, searching the first-level branches of each job
+    on a pool of `workers` processes. Results are merged back in submission
+    order, so the output matches `CompiledPanel.iter_assignments` run serially.
+    Workers send slot-level assignments back in bounded chunks and the panels
+    are expanded here, so memory stays flat however large a branch is.
+    At most `max_per_combination` panels per job and `max_solutions` in
+    total are searched for. When the caller stops iterating or sets
+    `stop_event`, the workers are told to stop and are not waited for.
+    With `cache_size`, each worker prunes with its own SubproblemCache.
+    Worker node and backtrack counts are added to `stats`.
+    """
+    limit = min((n for n in (max_per_combination, max_solutions) if n is not None), default=None)
+
+    def tasks():
+        for key, marker_indices in jobs:
+            first = marker_indices[0]
+            for option in range(len(compiled.slot_class_members[first])):
+                yield key, (marker_indices, option, limit, deadline, None)
+
+    context = multiprocessing.get_context()
+    stop = context.Event()
+    executor = ProcessPoolExecutor(
+        max_workers=workers, mp_context=context, initializer=_init_pool_worker, initargs=(compiled, cache_size, stop)
+    )
+    try:
+        # Keep a bounded window of chunks in flight instead of submitting every branch
+        task_iter = tasks()
+        pending = deque(
+            (key, task, executor.submit(_solve_branch, task))
+            for key, task in itertools.islice(task_iter, workers * 4)
+        )
+
+        previous_key, emitted, total = None, 0, 0
+        while pending:
+            key, task, future = pending.popleft()
+            if stop_event is not None:
+                while not wait([future], timeout=STOP_POLL_INTERVAL).done:
+                    if stop_event.is_set():
+                        return
+            chunk, resume, nodes, backtracks = future.result()
+            if stats is not None:
+                stats.nodes += nodes
+                stats.backtracks += backtracks
+
+            if key is not previous_key:
+                previous_key, emitted = key, 0
+            marker_indices, option = task[:2]
+            class_ids = compiled.slot_class_members[marker_indices[0]][option]
+            # Panels still wanted once this chunk is out, or None for no limit
+            chunk_panels = len(class_ids) * sum(math.prod(len(ids) for ids in item) for item in chunk)
+            remaining = [n - done - chunk_panels for n, done in ((max_per_combination, emitted), (max_solutions, total))
+                         if n is not None]
+            follow_up_limit = min(remaining, default=None)
+            if resume is not None and (follow_up_limit is None or follow_up_limit > 0):
+                # The rest of this branch comes next, ahead of the branches already queued
+                follow_up = (marker_indices, option, follow_up_limit, deadline, resume)
+                pending.appendleft((key, follow_up, executor.submit(_solve_branch, follow_up)))
+            else:
+                for next_key, next_task in itertools.islice(task_iter, 1):
+                    pending.append((next_key, next_task, executor.submit(_solve_branch, next_task)))
+
+            panels = (assignment for slot_assignment in chunk
+                      for assignment in itertools.product(class_ids, *slot_assignment))
+            for assignment in panels:
+                if max_per_combination is not None and emitted >= max_per_combination:
+                    break
+                emitted += 1
+                total += 1
+                yield key, assignment
+    finally:
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# ------------------------------------------------------------------- #
+# Branch-and-bound search for the cheapest panel
+# ------------------------------------------------------------------- #
+class BranchAndBound:
+    """
+    Finds the minimum-cost assignment for a set of markers of a CompiledPanel.
+    A panel costs sum(unary[a]) + sum(cross[a, slot(b)]) over its members a != b,
+    where `unary` has one entry per antibody id and `cross` is an
+    (antibodies x slots) array of non-negative pairwise costs such as the
+    relative spillover matrix.
+
+    Markers are branched fewest-free-candidates first with forward checking on
+    slot availability, candidates are tried cheapest first, and a subtree is
+    pruned when its cost plus, for every unplaced marker, the cheapest increment
+    of a candidate whose slot is still free reaches the best cost so far. That
+    bound ignores costs between unplaced markers, so it never overestimates.
+    """
+
+    def __init__(self, compiled, unary, cross):
+        self.compiled = compiled
+        self.unary = np.asarray(unary, dtype=float)
+        self.cross = np.asarray(cross, dtype=float)
+        self.cross_by_slot = np.ascontiguousarray(self.cross.T)
+        self.row_slots = np.array(compiled.row_slots, dtype=np.intp)
+        self.candidates = [np.array(ids, dtype=np.intp) for ids in compiled.candidate_ids]
+        self.nodes = 0
+        self.pruned = 0
+
+    def panel_cost(self, assignment):
+        """Evaluates the cost function on a complete assignment."""
+        rows = np.array(assignment, dtype=np.intp)
+        cross = self.cross[np.ix_(rows, self.row_slots[rows])]
+        return float(self.unary[rows].sum() + cross.sum() - np.trace(cross))
+
+    def improve(self, marker_indices, assignment, deadline=None):
+        """
+        Greedy local search from a complete assignment: swaps one marker at a
+        time to another candidate in a slot the others leave free whenever
+        that lowers the cost, until no swap helps or the deadline passes.
+        Returns `(cost, assignment)`.
+        """
+        assignment = list(assignment)
+        cost = self.panel_cost(assignment)
+        improved = True
+        while improved and (deadline is None or time.monotonic() < deadline):
+            improved = False
+            for i, marker in enumerate(marker_indices):
+                taken = {int(self.row_slots[row]) for j, row in enumerate(assignment) if j != i}
+                for row in self.candidates[marker].tolist():
+                    if row == assignment[i] or self.row_slots[row] in taken:
+                        continue
+                    trial = assignment[:i] + [row] + assignment[i + 1:]
+                    trial_cost = self.panel_cost(trial)
+                    if trial_cost < cost:
+                        assignment, cost, improved = trial, trial_cost, True
+        return cost, tuple(assignment)
+
+    def solve(self, marker_indices, upper_bound=float('inf'), deadline=None, stop_event=None):
+        """
+        Returns `(cost, assignment, complete)`. `assignment` is a tuple of
+        antibody ids in `marker_indices` order, or None when nothing beats
+        `upper_bound`; `complete` is False when the deadline or `stop_event`
+        cut the search short, so the result is not proven optimal.
+        """
+        self.best_cost = upper_bound
+        self.best = None
+        self.complete = True
+        self.deadline = deadline
+        self.stop_event = stop_event
+        num_slots = len(self.compiled.slots)
+        self.search(
+            list(marker_indices), {}, 0.0,
+            np.ones(num_slots, dtype=bool), np.zeros(num_slots), np.zeros(len(self.row_slots))
+        )
+        if self.best is None:
+            return self.best_cost, None, self.complete
+        return self.best_cost, tuple(self.best[m] for m in marker_indices), self.complete
+
+    def search(self, remaining, chosen, cost, slot_free, spill_into, row_cross):
+        # spill_into[s]: cost the placed antibodies add to an antibody in slot s
+        # row_cross[a]: cost antibody a adds towards the placed antibodies
+        if not self.complete:
+            return
+        if (self.deadline is not None and time.monotonic() >= self.deadline) or \
+                (self.stop_event is not None and self.stop_event.is_set()):
+            self.complete = False
+            return
+        self.nodes += 1
+
+        if not remaining:
+            if cost < self.best_cost:
+                self.best_cost = cost
+                self.best = dict(chosen)
+            return
+
+        increments = self.unary + spill_into[self.row_slots] + row_cross
+        bound = cost
+        pick, pick_rows, pick_costs = None, None, None
+        for marker in remaining:
+            rows = self.candidates[marker]
+            rows = rows[slot_free[self.row_slots[rows]]]
+            if len(rows) == 0:
+                # Forward check: this marker has no free slot left
+                self.pruned += 1
+                return
+            costs = increments[rows]
+            bound += costs.min()
+            if pick is None or len(rows) < len(pick_rows):
+                pick, pick_rows, pick_costs = marker, rows, costs
+        if bound >= self.best_cost:
+            self.pruned += 1
+            return
+
+        rest = [marker for marker in remaining if marker != pick]
+        for i in np.argsort(pick_costs, kind='stable'):
+            new_cost = cost + pick_costs[i]
+            if new_cost >= self.best_cost:
+                # Candidates are sorted, so every later one is at least as bad
+                break
+            row = pick_rows[i]
+            slot = self.row_slots[row]
+            chosen[pick] = int(row)
+            slot_free[slot] = False
+            self.search(rest, chosen, new_cost, slot_free, spill_into + self.cross[row], row_cross + self.cross_by_slot[slot])
+            slot_free[slot] = True
+            del chosen[pick]
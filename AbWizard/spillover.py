@@ -0,0 +1,98 @@
+import heapq
+
+import numpy as np
+
+
+def normal_cdf(x):
+    """Vectorised standard normal CDF (Abramowitz & Stegun 7.1.26, |error| < 1.5e-7)."""
+    z = np.abs(x) / np.sqrt(2.0)
+    t = 1.0 / (1.0 + 0.3275911 * z)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1.0 - poly * np.exp(-z * z)
+    return 0.5 * (1.0 + np.sign(x) * erf)
+
+
+# ------------------------------------------------------------------- #
+# Fluor x detector spillover matrix
+# ------------------------------------------------------------------- #
+class SpilloverMatrix:
+    """
+    Precomputes, once per run, how much of each candidate antibody's signal
+    lands in every (laser, detector) slot of a CompiledPanel.
+
+    Spectra are approximated by Gaussians: the emission peak `em` spread by
+    EMISSION_SIGMA is integrated over each detector band (`center` +/- `width`/2),
+    and weighted by how well the slot's laser excites the fluor (a Gaussian in
+    `ex` - laser with EXCITATION_SIGMA). A panel's score is the total signal its
+    fluors spill into the other panel members' detectors, each fluor normalised
+    by the signal in its own detector. Lower is better.
+    """
+    EMISSION_SIGMA = 20.0
+    EXCITATION_SIGMA = 25.0
+
+    def __init__(self, compiled, instrument_config, emission_sigma=None, excitation_sigma=None):
+        emission_sigma = emission_sigma or self.EMISSION_SIGMA
+        excitation_sigma = excitation_sigma or self.EXCITATION_SIGMA
+
+        ex = np.array([row['ex'] for row in compiled.rows], dtype=float)
+        em = np.array([row['em'] for row in compiled.rows], dtype=float)
+        slot_lasers = np.array([laser for laser, _ in compiled.slots], dtype=float)
+        lows, highs = [], []
+        for laser, detector_name in compiled.slots:
+            props = instrument_config['lasers'][laser][detector_name]
+            lows.append(props['center'] - props['width'] / 2)
+            highs.append(props['center'] + props['width'] / 2)
+        lows = np.array(lows, dtype=float)
+        highs = np.array(highs, dtype=float)
+
+        excitation = np.exp(-0.5 * ((ex[:, None] - slot_lasers[None, :]) / excitation_sigma) ** 2)
+        in_band = (
+            normal_cdf((highs[None, :] - em[:, None]) / emission_sigma)
+            - normal_cdf((lows[None, :] - em[:, None]) / emission_sigma)
+        )
+        # (antibodies x slots): relative signal of each candidate in each detector
+        self.matrix = excitation * in_band
+        self.row_slots = np.array(compiled.row_slots, dtype=np.intp)
+
+    def relative_matrix(self):
+        """Each row divided by the antibody's signal in its own slot (so the own slot is 1)."""
+        own = self.matrix[np.arange(len(self.row_slots)), self.row_slots]
+        return self.matrix / np.maximum(own, 1e-12)[:, None]
+
+    def score(self, assignment):
+        """Total normalised spillover of one panel (a tuple of antibody ids)."""
+        return float(self.score_many([assignment])[0])
+
+    def score_many(self, assignments):
+        """Scores a batch of equally sized panels in one vectorised pass."""
+        ids = np.array(assignments, dtype=np.intp)           # (panels x k)
+        if ids.ndim != 2 or ids.shape[1] == 0:
+            return np.zeros(len(assignments))
+        slots = self.row_slots[ids]                           # (panels x k)
+        # signal[p, i, j]: fluor i of panel p seen in the detector of member j
+        signal = self.matrix[ids[:, :, None], slots[:, None, :]]
+        own = np.diagonal(signal, axis1=1, axis2=2)           # (panels x k)
+        ratio = signal / np.maximum(own, 1e-12)[:, :, None]
+        return ratio.sum(axis=(1, 2)) - ids.shape[1]
+
+
+class TopPanels:
+    """Keeps the `top_k` lowest-scoring panels seen so far in a bounded heap."""
+
+    def __init__(self, top_k):
+        self.top_k = top_k
+        self.heap = []
+        self.seen = 0
+
+    def push(self, score, item):
+        # Max-heap on score via negation; ties keep the panel found first
+        entry = (-score, -self.seen, item)
+        self.seen += 1
+        if len(self.heap) < self.top_k:
+            heapq.heappush(self.heap, entry)
+        elif entry[:2] > self.heap[0][:2]:
+            heapq.heapreplace(self.heap, entry)
+
+    def best(self):
+        """Returns `(score, item)` pairs, best first."""
+        return [(-neg_score, item) for neg_score, _, item in sorted(self.heap, key=lambda entry: entry[:2], reverse=True)]
@@ -0,0 +1,87 @@
+import json
+import time
+from contextlib import contextmanager
+
+
+# ------------------------------------------------------------------- #
+# Solver instrumentation
+# ------------------------------------------------------------------- #
+class SolverStats:
+    """
+    Counters and per-phase wall times collected while a Wizard runs.
+
+    Phases are 'filter', 'matching', 'combinations' (screening marker
+    combinations), 'search' and 'write' (flushing result batches to disk).
+    'search' is the wall time of an enumeration, so it also covers the
+    combination screening and, when panels are streamed to a writer, the
+    writing done along the way.
+    """
+
+    def __init__(self):
+        self.phase_seconds = {}
+        self.combinations_examined = 0
+        # Combinations rejected before any search, by reason
+        self.combinations_skipped_no_antibodies = 0
+        self.combinations_skipped_unplaceable = 0
+        self.combinations_skipped_known_infeasible = 0
+        self.nodes = 0
+        self.backtracks = 0
+        self.pruned = 0
+        self.solutions_by_markers = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + seconds
+
+    def add_solutions(self, num_markers, count):
+        if count:
+            self.solutions_by_markers[num_markers] = self.solutions_by_markers.get(num_markers, 0) + count
+
+    def to_dict(self):
+        return {
+            'phase_seconds': dict(self.phase_seconds),
+            'combinations': {
+                'examined': self.combinations_examined,
+                'skipped_no_antibodies': self.combinations_skipped_no_antibodies,
+                'skipped_unplaceable': self.combinations_skipped_unplaceable,
+                'skipped_known_infeasible': self.combinations_skipped_known_infeasible,
+            },
+            'nodes': self.nodes,
+            'backtracks': self.backtracks,
+            'pruned': self.pruned,
+            # JSON object keys must be strings
+            'solutions_by_markers': {str(k): v for k, v in sorted(self.solutions_by_markers.items())},
+        }
+
+    def to_json(self, path=None):
+        """Returns the stats as a JSON string, and also writes them to `path` when given."""
+        text = json.dumps(self.to_dict(), indent=2)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(text + '\n')
+        return text
+
+    def summary_lines(self):
+        """Human-readable lines for the log."""
+        phases = ', '.join(f"{name} {seconds:.3f}s" for name, seconds in self.phase_seconds.items())
+        skipped = (self.combinations_skipped_no_antibodies + self.combinations_skipped_unplaceable
+                   + self.combinations_skipped_known_infeasible)
+        lines = [
+            f"Phases: {phases or 'none'}",
+            f"Combinations: {self.combinations_examined} examined, {skipped} skipped "
+            f"({self.combinations_skipped_no_antibodies} missing antibodies, "
+            f"{self.combinations_skipped_unplaceable} unplaceable, "
+            f"{self.combinations_skipped_known_infeasible} containing a known unplaceable subset)",
+            f"Search: {self.nodes} node(s), {self.backtracks} backtrack(s), {self.pruned} pruned",
+        ]
+        if self.solutions_by_markers:
+            counts = ', '.join(f"{k} markers: {v}" for k, v in sorted(self.solutions_by_markers.items()))
+            lines.append(f"Solutions: {counts}")
+        return lines
@@ -1,9 +1,22 @@
-import sys
 import itertools
-import csv
+import math
 from datetime import datetime
-from collections import defaultdict
 import os
+import shutil
+import sqlite3
+import time
+import logging
+
+import numpy as np
+
+from detector_index import DetectorIndex
+from spillover import SpilloverMatrix, TopPanels
+from result_cache import ResultCache, fingerprint
+from solver import BranchAndBound, CompiledPanel, SubproblemCache, build_slot_graph, hopcroft_karp, iter_parallel_assignments
+from stats import SolverStats
+from writers import is_columnar_path, open_result_writer, write_slot_panels_csv
+
+logger = logging.getLogger(__name__)
 
 # --- Data Definitions (remain the same) ---
 ANTIBODY_PANEL = {
@@ -38,71 +51,205 @@ INSTRUMENT_CONFIG = {
 }
 
 class Wizard:
-    def __init__(self, antibody_panel, instrument_config):
+    # Default maximum distance (nm) between an antibody's excitation peak and
+    # a laser; a Wizard can be given its own `excitation_tolerance`
+    EXCITATION_TOLERANCE = 10
+    # Number of panels between two progress reports of iter_solutions
+    PROGRESS_INTERVAL = 1000
+    # Number of panels scored together by find_top_panels
+    SCORE_BATCH_SIZE = 4096
+    # Entries kept in the (marker subset, used slots) memo of a search; 0 disables it
+    SUBPROBLEM_CACHE_SIZE = 100000
+    # SQLite file of solved results reused by `run` while nothing changed; None disables it
+    RESULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'abwizard', 'results.sqlite')
+    # Compressed bytes kept in the result cache before the least recently used entries go
+    RESULT_CACHE_MAX_BYTES = 256 * 2**20
+    # Enumerations listing more panels are cached as counts plus their result file
+    RESULT_CACHE_MAX_PANELS = 10000
+
+    def __init__(self, antibody_panel, instrument_config, excitation_tolerance=None):
         self.antibody_panel = antibody_panel
         self.instrument_config = instrument_config
+        # Every laser within this many nm of an antibody's `ex` can excite it
+        self.excitation_tolerance = self.EXCITATION_TOLERANCE if excitation_tolerance is None else excitation_tolerance
+        # Interval indexes over detector bands, built lazily per laser / filter set
+        self.detector_indexes = {}
+        self.filter_indexes = {}
+        # (compiled panel, SubproblemCache) shared by count/feasibility queries, built lazily
+        self.query_state = None
+        # Timings and counters of the work done so far; `run` starts a fresh one
+        self.stats = SolverStats()
+
+    @classmethod
+    def from_catalog(cls, catalog_path, instrument_config, markers=None, excitation_tolerance=None):
+        """Builds a Wizard from a binary antibody catalog, optionally only for `markers`."""
+        from catalog import load_catalog
+        return cls(load_catalog(catalog_path, markers), instrument_config, excitation_tolerance)
+
+    def invalidate_detector_indexes(self):
+        """
+        Drops the cached detector indexes and query state; call after editing
+        `instrument_config` (or `antibody_panel`) in place.
+        """
+        self.detector_indexes.clear()
+        self.filter_indexes.clear()
+        self.query_state = None
+
+    def get_detector_index(self, laser):
+        """Returns the (cached) interval index over the detectors of `laser`."""
+        index = self.detector_indexes.get(laser)
+        if index is None:
+            index = DetectorIndex(self.instrument_config['lasers'].get(laser, {}))
+            self.detector_indexes[laser] = index
+        return index
+
+    def get_detectors_for_emission(self, emission_val, laser):
+        """Finds every detector name on `laser` whose band contains the emission value."""
+        return self.get_detector_index(laser).lookup(emission_val)
 
-    
     def get_detector_for_emission(self, emission_val, laser):
         """Finds a matching detector name for a given emission value on a specific laser."""
-        # Get the detectors associated with the specified laser
-        detectors_for_laser = self.instrument_config['lasers'].get(laser, {})
-        for name, detector_props in detectors_for_laser.items():
-            if detector_props['center'] - detector_props['width'] / 2 <= emission_val < detector_props['center'] + detector_props['width'] / 2:
-                return name
-        return None
+        hits = self.get_detectors_for_emission(emission_val, laser)
+        return hits[0] if hits else None
 
 
     def get_channel_type_for_emission(self, emission_val, filters):
-        for name, f in filters.items():
-            if f['center'] - f['width'] / 2 <= emission_val < f['center'] + f['width'] / 2:
-                return name
-        return None
+        # Keep a reference to `filters` next to its index so its id stays unique
+        cached = self.filter_indexes.get(id(filters))
+        if cached is None:
+            cached = (filters, DetectorIndex(filters))
+            self.filter_indexes[id(filters)] = cached
+        hits = cached[1].lookup(emission_val)
+        return hits[0] if hits else None
+
+    def get_compatible_slots(self, antibody, lasers=None):
+        """Lists the (laser, detector) slots `antibody` can use, optionally only on `lasers`."""
+        if lasers is None:
+            lasers = self.instrument_config.get('lasers', {}).keys()
+        slots = []
+        for laser in lasers:
+            if abs(antibody['ex'] - laser) <= self.excitation_tolerance:
+                slots.extend((laser, name) for name in self.get_detectors_for_emission(antibody['em'], laser))
+        return slots
+
+    def build_slot_arrays(self):
+        """
+        Flattens the instrument into one entry per (laser, detector) slot and
+        returns the laser wavelengths, the slot list, each slot's laser index
+        and the lower/upper band edges as NumPy arrays.
+        """
+        lasers = list(self.instrument_config['lasers'].keys())
+        slots, slot_laser_idx, lows, highs = [], [], [], []
+        for laser_idx, laser in enumerate(lasers):
+            for name, props in self.instrument_config['lasers'][laser].items():
+                slots.append((laser, name))
+                slot_laser_idx.append(laser_idx)
+                lows.append(props['center'] - props['width'] / 2)
+                highs.append(props['center'] + props['width'] / 2)
+        return (
+            np.array(lasers, dtype=float),
+            slots,
+            np.array(slot_laser_idx, dtype=np.intp),
+            np.array(lows, dtype=float),
+            np.array(highs, dtype=float),
+        )
+
+    def build_antibody_arrays(self):
+        """
+        Flattens the panel into `(records, ex, em)`: the (marker, antibody)
+        pairs and their excitation and emission peaks as NumPy arrays. They
+        do not depend on the instrument, so several Wizards over one panel
+        can share them.
+        """
+        records = [(marker, ab) for marker, antibodies in self.antibody_panel.items() for ab in antibodies]
+        ex = np.array([ab['ex'] for _, ab in records], dtype=float)
+        em = np.array([ab['em'] for _, ab in records], dtype=float)
+        return records, ex, em
 
-    def prepare_and_filter_panel(self):
+    def prepare_and_filter_panel(self, antibody_arrays=None):
+        """
+        Matches every antibody against every (laser, detector) slot in one
+        broadcasted pass. An antibody is kept once per compatible slot, so
+        fluors visible in several detectors or excited by several lasers
+        within `excitation_tolerance` (e.g. tandem dyes) keep all of their
+        alternatives. Pass `antibody_arrays` from `build_antibody_arrays` to
+        reuse them.
+        """
+        start = time.perf_counter()
         filtered_panel = {}
-        print("--- Pre-processing and Filtering Antibodies ---")
-        for marker, antibodies in self.antibody_panel.items():
-            valid_abs = []
-            for ab in antibodies:
-                compatible_laser = None
-                # Check all available lasers for excitation compatibility
-                for laser in self.instrument_config['lasers'].keys():
-                    if abs(ab['ex'] - laser) <= 10:
-                        compatible_laser = laser
-                        break # Found a laser, no need to check others
-
-                if not compatible_laser:
-                    print(f"  > FILTERED OUT: {ab['name']} (Ex={ab['ex']}nm has no compatible laser)")
-                    continue
-
-                # For the compatible laser, check if any of its detectors can see the emission
-                detector_name = self.get_detector_for_emission(ab['em'], compatible_laser)
-                if detector_name is None:
-                    print(f"  > FILTERED OUT: {ab['name']} (Em={ab['em']}nm on Laser {compatible_laser} not detected by any specific detector)")
-                    continue
-
-                # If we found a valid laser-detector pair, add it as a possibility
+        logger.info("--- Pre-processing and Filtering Antibodies ---")
+        laser_arr, slots, slot_laser_idx, lows, highs = self.build_slot_arrays()
+
+        records, ex, em = antibody_arrays if antibody_arrays is not None else self.build_antibody_arrays()
+
+        # (antibodies x lasers): which lasers can excite each antibody
+        excited = np.abs(ex[:, None] - laser_arr[None, :]) <= self.excitation_tolerance
+        # (antibodies x slots): excited by the slot's laser and emitting inside its band
+        compatible = (
+            excited[:, slot_laser_idx]
+            & (lows[None, :] <= em[:, None])
+            & (em[:, None] < highs[None, :])
+        )
+
+        # Compressed rows: the compatible slots of antibody i are
+        # candidate_slots[offsets[i]:offsets[i + 1]], so the matrix is only
+        # walked in bulk and never row by row
+        counts = compatible.sum(axis=1)
+        offsets = np.concatenate(([0], np.cumsum(counts))).tolist()
+        counts = counts.tolist()
+        candidate_slots = np.nonzero(compatible)[1].tolist()
+
+        for i, (marker, ab) in enumerate(records):
+            if not counts[i]:
+                ab_excited = excited[i]
+                if not ab_excited.any():
+                    logger.debug(f"  > FILTERED OUT: {ab['name']} (Ex={ab['ex']}nm has no compatible laser)")
+                else:
+                    lasers_str = ', '.join(str(int(laser)) for laser in laser_arr[ab_excited])
+                    logger.debug(f"  > FILTERED OUT: {ab['name']} (Em={ab['em']}nm on Laser {lasers_str} not detected by any specific detector)")
+                continue
+
+            # Add every valid laser-detector pair as a possibility
+            valid_abs = filtered_panel.setdefault(marker, [])
+            for slot_id in candidate_slots[offsets[i]:offsets[i + 1]]:
+                laser, detector_name = slots[slot_id]
                 valid_ab = ab.copy()
                 valid_ab['detector_name'] = detector_name
-                valid_ab['used_laser'] = compatible_laser
+                valid_ab['used_laser'] = laser
                 valid_abs.append(valid_ab)
 
-            if valid_abs:
-                filtered_panel[marker] = valid_abs
-        print("--- Pre-processing Complete ---\n")
+        # Antibodies detected on more than one laser, each kept on all of them
+        slot_lasers = np.zeros((len(slots), len(laser_arr)), dtype=np.intp)
+        slot_lasers[np.arange(len(slots)), slot_laser_idx] = 1
+        multi_laser = int(((compatible.astype(np.intp) @ slot_lasers > 0).sum(axis=1) > 1).sum())
+        if multi_laser:
+            logger.info(f"  {multi_laser} antibodies can be used on more than one laser")
+
+        kept = sum(1 for count in counts if count)
+        logger.info(f"  {kept} of {len(records)} antibodies are compatible with the instrument "
+                    f"({len(records) - kept} filtered out)")
+        logger.info("--- Pre-processing Complete ---")
+        self.stats.add_time('filter', time.perf_counter() - start)
         return filtered_panel
 
-    def find_solutions_recursive(self, markers, panel, solution, used_slots, all_solutions):
+    def iter_panels_recursive(self, markers, panel, solution, used_slots, deadline=None):
+        """
+        Lazily yields every complete panel for `markers`. Each yielded panel is
+        a fresh list, so callers may keep it. Stops early once the
+        `time.monotonic()` value `deadline` has passed.
+        """
+        if deadline is not None and time.monotonic() >= deadline:
+            return
+
         if not markers:
-            all_solutions.append(list(solution))
+            yield list(solution)
             return
 
         marker, remaining_markers = markers[0], markers[1:]
 
         # If a marker has no compatible antibodies after filtering, skip it.
         if marker not in panel:
-            self.find_solutions_recursive(remaining_markers, panel, solution, used_slots, all_solutions)
+            yield from self.iter_panels_recursive(remaining_markers, panel, solution, used_slots, deadline)
             return
 
         # Try each valid antibody for the current marker
@@ -117,93 +264,683 @@ class Wizard:
                 used_slots.add(instrument_slot)
 
                 # Recurse to solve for the rest of the markers
-                self.find_solutions_recursive(remaining_markers, panel, solution, used_slots, all_solutions)
+                yield from self.iter_panels_recursive(remaining_markers, panel, solution, used_slots, deadline)
 
                 # Backtrack: un-assign the antibody and free the slot for other possibilities
                 used_slots.remove(instrument_slot)
                 solution.pop()
 
+    def find_solutions_recursive(self, markers, panel, solution, used_slots, all_solutions):
+        all_solutions.extend(self.iter_panels_recursive(markers, panel, solution, used_slots))
+
+    def result_package(self, markers_used, **fields):
+        """Packages one result: the markers used, the panel's markers left out, then `fields`."""
+        return {
+            "markers_used": list(markers_used),
+            "markers_omitted": [m for m in self.antibody_panel if m not in markers_used],
+            **fields
+        }
+
     def save_results_to_csv(self, results, filename):
+        """Writes in-memory result packages as Parquet or Feather when the extension asks for it, else as CSV."""
         if not results:
-            print("No results to save.")
+            logger.warning("No results to save.")
             return
-        headers = ['Solution_Set_ID','Panel_ID','Markers_Used','Markers_Omitted','Marker','Antibody_Name','Excitation_Laser (nm)','Emission_Wavelength (nm)','Detector']
-        
-        with open(filename, 'w', newline='') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=headers)
-            writer.writeheader()
+
+        with open_result_writer(filename) as writer:
             for set_id, result_package in enumerate(results, 1):
                 mu_str = ', '.join(result_package['markers_used'])
                 mo_str = ', '.join(result_package['markers_omitted'])
                 for panel_id, panel in enumerate(result_package['solutions'], 1):
-                    for antibody in panel:
-                        writer.writerow({
-                            'Solution_Set_ID': set_id, 'Panel_ID': panel_id,
-                            'Markers_Used': mu_str, 'Markers_Omitted': mo_str,
-                            'Marker': antibody['marker'], 'Antibody_Name': antibody['name'],
-                            'Excitation_Laser (nm)': antibody['used_laser'],
-                            'Emission_Wavelength (nm)': antibody['em'],
-                            ### MODIFIED: Use the new 'detector_name' key
-                            'Detector': antibody['detector_name']
-                        })
-        print(f"\nResults successfully saved to {filename}")
-
-
-    def find_best_solution(self, compatible_panel):
+                    writer.write_panel(set_id, panel_id, mu_str, mo_str, panel)
+        self.stats.add_time('write', writer.write_seconds)
+        logger.info(f"Results successfully saved to {filename}")
+
+    def save_solutions(self, solutions, filename, keep_results=True):
+        """
+        Streams `(markers_used, panel)` pairs (as produced by `iter_solutions`)
+        into `filename` in row batches. Returns one package per solution set;
+        its panels are only kept in memory when `keep_results` is true, while
+        `num_solutions` always holds the count.
+        """
+        found_solutions = []
+        writer = None
+        try:
+            # Panels arrive grouped by combination, so each group is one solution set
+            groups = itertools.groupby(solutions, key=lambda item: tuple(item[0]))
+            for set_id, (markers_used, group) in enumerate(groups, 1):
+                if writer is None:
+                    writer = open_result_writer(filename)
+                result_package = self.result_package(markers_used, solutions=[], num_solutions=0)
+                mu_str = ', '.join(result_package['markers_used'])
+                mo_str = ', '.join(result_package['markers_omitted'])
+                for panel_id, (_, panel) in enumerate(group, 1):
+                    writer.write_panel(set_id, panel_id, mu_str, mo_str, panel)
+                    if keep_results:
+                        result_package['solutions'].append(panel)
+                    result_package['num_solutions'] = panel_id
+                found_solutions.append(result_package)
+        finally:
+            if writer is not None:
+                writer.close()
+                self.stats.add_time('write', writer.write_seconds)
+
+        if writer is None:
+            logger.warning("No results to save.")
+        else:
+            logger.info(f"Results successfully saved to {filename}")
+        return found_solutions
+
+
+    def find_max_panel(self, compatible_panel, markers=None):
+        """
+        Returns the maximum number of markers that fit on the instrument and
+        one witness panel, using a bipartite matching over the slot graph.
+        """
+        if markers is None:
+            markers = list(self.antibody_panel.keys())
+        with self.stats.phase('matching'):
+            matching = hopcroft_karp(build_slot_graph(compatible_panel, markers))
+
+        witness = []
+        for marker in markers:
+            if marker not in matching:
+                continue
+            # Any antibody of the marker sitting in the matched slot will do
+            for ab in compatible_panel[marker]:
+                if (ab['used_laser'], ab['detector_name']) == matching[marker]:
+                    witness.append({'marker': marker, **ab})
+                    break
+        return len(witness), witness
+
+    def get_default_output_path(self, extension='.csv'):
+        """Builds a timestamped results path on the user's Desktop."""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # Ensure the Desktop directory exists
+        desktop_path = os.path.join(os.path.expanduser('~'), 'Desktop')
+        os.makedirs(desktop_path, exist_ok=True)
+        return os.path.join(desktop_path, f"antibody_panels_{timestamp}{extension}")
+
+    def iter_marker_combinations(self, compatible_panel, num_markers, compiled=None, cache=None):
+        """
+        Yields the combinations of `num_markers` markers that can all be placed
+        at once. With a compiled panel and a SubproblemCache, combinations that
+        contain a marker subset already known to be unplaceable are skipped
+        without running the matching.
+        """
+        stats = self.stats
+        all_marker_names = list(self.antibody_panel.keys())
+        for marker_combo in itertools.combinations(all_marker_names, num_markers):
+            start = time.perf_counter()
+            stats.combinations_examined += 1
+            placeable = False
+            # Skip combinations where a marker has no compatible antibodies
+            if not all(m in compatible_panel for m in marker_combo):
+                stats.combinations_skipped_no_antibodies += 1
+            # Skip combinations whose markers cannot all be given distinct slots
+            elif compiled is not None and cache is not None:
+                marker_mask = compiled.marker_mask(compiled.marker_indices(marker_combo))
+                if cache.contains_infeasible_set(marker_mask):
+                    stats.combinations_skipped_known_infeasible += 1
+                elif not compiled.is_completable(marker_mask, 0, cache):
+                    stats.combinations_skipped_unplaceable += 1
+                else:
+                    placeable = True
+            elif len(hopcroft_karp(build_slot_graph(compatible_panel, marker_combo))) < num_markers:
+                stats.combinations_skipped_unplaceable += 1
+            else:
+                placeable = True
+            stats.add_time('combinations', time.perf_counter() - start)
+            if placeable:
+                yield list(marker_combo)
+
+    def compile_panel(self, compatible_panel):
+        """Interns markers, antibodies and slots once for a whole search."""
+        return CompiledPanel(compatible_panel, list(self.antibody_panel.keys()))
+
+    def get_query_state(self, compatible_panel=None):
+        """
+        Returns `(compatible_panel, compiled, cache)` for count and feasibility
+        queries. The panel is filtered and compiled once and then reused,
+        unless a filtered panel is passed in.
+        """
+        if compatible_panel is not None:
+            return compatible_panel, self.compile_panel(compatible_panel), SubproblemCache(self.SUBPROBLEM_CACHE_SIZE)
+        if self.query_state is None:
+            compatible_panel = self.prepare_and_filter_panel()
+            self.query_state = (
+                compatible_panel, self.compile_panel(compatible_panel), SubproblemCache(self.SUBPROBLEM_CACHE_SIZE)
+            )
+        return self.query_state
+
+    def get_marker_mask(self, compiled, markers):
+        unknown = [m for m in markers if m not in compiled.marker_index]
+        if unknown:
+            raise ValueError(f"Unknown marker(s): {', '.join(map(str, unknown))}")
+        return compiled.marker_mask(compiled.marker_indices(markers))
+
+    def is_feasible(self, markers, compatible_panel=None):
+        """
+        True when every marker in `markers` can be given its own (laser,
+        detector) slot at once. Only a bipartite matching is run, and the
+        answer is memoized, so many candidate panels can be screened quickly.
+        """
+        _, compiled, cache = self.get_query_state(compatible_panel)
+        marker_mask = self.get_marker_mask(compiled, markers)
+        if cache.contains_infeasible_set(marker_mask):
+            return False
+        return compiled.is_completable(marker_mask, 0, cache)
+
+    def count_solutions(self, markers=None, compatible_panel=None):
+        """
+        Counts panels without building them. With `markers`, counts the
+        panels using exactly those markers; otherwise counts every panel
+        that uses the maximum number of markers, i.e. what
+        `find_best_solution` would write. Antibodies sharing a slot are
+        counted together and sub-problems are memoized across combinations.
+        """
+        compatible_panel, compiled, cache = self.get_query_state(compatible_panel)
+        if markers is not None:
+            return compiled.count_assignments(self.get_marker_mask(compiled, markers), 0, cache)
+
+        num_markers, _ = self.find_max_panel(compatible_panel)
+        if num_markers == 0:
+            return 0
+        total = 0
+        for marker_combo in self.iter_marker_combinations(compatible_panel, num_markers, compiled, cache):
+            total += compiled.count_assignments(compiled.marker_mask(compiled.marker_indices(marker_combo)), 0, cache)
+        return total
+
+    def iter_solutions(self, compatible_panel=None, max_solutions=None, max_per_combination=None, time_budget=None, workers=None,
+                       progress_callback=None, stop_event=None):
+        """
+        Lazily yields `(markers_used, panel)` for every panel that uses the
+        maximum number of markers, in the same order as `find_best_solution`.
+
+        The search stops after `max_solutions` panels in total, moves on to the
+        next combination after `max_per_combination` panels, and gives up once
+        `time_budget` seconds have elapsed or `stop_event` (a threading.Event)
+        is set. With `workers` > 1 the first-level branches are searched on a
+        process pool; the output order is unchanged.
+
+        `progress_callback(num_markers, combinations_tried, solutions_found)`
+        is called for every combination searched and every
+        `PROGRESS_INTERVAL` panels.
+        """
+        if compatible_panel is None:
+            compatible_panel = self.prepare_and_filter_panel()
+        compiled = self.compile_panel(compatible_panel)
+        assignments = self.iter_solution_assignments(
+            compiled, compatible_panel, max_solutions, max_per_combination, time_budget, workers,
+            progress_callback, stop_event
+        )
+        for marker_combo, assignment in assignments:
+            yield marker_combo, compiled.build_panel(assignment)
+
+    def iter_solution_assignments(self, compiled, compatible_panel, max_solutions=None, max_per_combination=None, time_budget=None,
+                                  workers=None, progress_callback=None, stop_event=None):
+        """
+        Same search as `iter_solutions`, but yields `(markers_used, assignment)`
+        where `assignment` is a tuple of antibody ids of `compiled`, for callers
+        that post-process panels in bulk.
+        """
+        start = time.monotonic()
+        deadline = start + time_budget if time_budget is not None else None
+
+        num_markers, _ = self.find_max_panel(compatible_panel)
+        if num_markers == 0:
+            return
+
+        counts = {'combinations': 0, 'solutions': 0}
+        cache = SubproblemCache(self.SUBPROBLEM_CACHE_SIZE) if self.SUBPROBLEM_CACHE_SIZE else None
+
+        def report():
+            if progress_callback is not None:
+                progress_callback(num_markers, counts['combinations'], counts['solutions'])
+
+        def tracked_combos():
+            for marker_combo in self.iter_marker_combinations(compatible_panel, num_markers, compiled, cache):
+                if stop_event is not None and stop_event.is_set():
+                    return
+                counts['combinations'] += 1
+                report()
+                yield marker_combo
+
+        if workers is not None and workers > 1:
+            jobs = ((marker_combo, compiled.marker_indices(marker_combo)) for marker_combo in tracked_combos())
+            results = iter_parallel_assignments(
+                compiled, jobs, workers, max_per_combination, deadline, self.SUBPROBLEM_CACHE_SIZE or None, self.stats,
+                max_solutions, stop_event
+            )
+        else:
+            results = self.iter_serial_assignments(
+                compiled, tracked_combos(), max_per_combination, deadline, stop_event, cache
+            )
+
+        try:
+            for marker_combo, assignment in results:
+                yield marker_combo, assignment
+                counts['solutions'] += 1
+                if counts['solutions'] % self.PROGRESS_INTERVAL == 0:
+                    report()
+                if max_solutions is not None and counts['solutions'] >= max_solutions:
+                    return
+                if stop_event is not None and stop_event.is_set():
+                    return
+        finally:
+            # Shuts the process pool down when the caller stops early
+            results.close()
+            report()
+            self.stats.add_solutions(num_markers, counts['solutions'])
+            self.stats.add_time('search', time.monotonic() - start)
+        if deadline is not None and time.monotonic() >= deadline:
+            logger.warning(f"Time budget of {time_budget}s exhausted after {counts['solutions']} panel(s).")
+
+    def iter_serial_assignments(self, compiled, marker_combos, max_per_combination=None, deadline=None, stop_event=None,
+                                cache=None):
+        """Yields `(marker_combo, assignment)` for each combination, searched one after another."""
+        for marker_combo in marker_combos:
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            search = compiled.iter_assignments(
+                compiled.marker_indices(marker_combo), deadline, stop_event=stop_event, cache=cache, stats=self.stats
+            )
+            assignments = itertools.islice(search, max_per_combination) if max_per_combination is not None else search
+            try:
+                for assignment in assignments:
+                    yield marker_combo, assignment
+            finally:
+                # Records the node counts even when the combination is cut short
+                search.close()
+
+    def find_best_solution(self, compatible_panel, max_solutions=None, max_per_combination=None, time_budget=None, workers=None,
+                           output_path=None, keep_results=True, progress_callback=None, stop_event=None):
+        """
+        Streams every panel that uses the maximum number of markers to
+        `output_path` (a timestamped CSV on the Desktop by default). Pass
+        `keep_results=False` to avoid holding the panels in memory.
+        """
         all_marker_names = list(self.antibody_panel.keys()) # Use original panel for complete marker list
 
-        for num_markers in range(len(all_marker_names), 0, -1):
-            print(f"--- Searching for solutions with {num_markers} markers ---")
-            marker_combinations = itertools.combinations(all_marker_names, num_markers)
-            found_solutions = []
-
-            for marker_combo in marker_combinations:
-                # Skip combinations where a marker has no compatible antibodies
-                if not all(m in compatible_panel for m in marker_combo):
-                    continue
-
-                solutions_for_this_combo = []
-                ### MODIFIED: The call to the recursive solver is simpler (no defaultdict needed)
-                self.find_solutions_recursive(
-                    list(marker_combo),
-                    compatible_panel,
-                    [], # current solution
-                    set(), # used laser-detector slots
-                    solutions_for_this_combo
+        # The matching gives the best achievable marker count up front, so
+        # only combinations of exactly that size need to be enumerated.
+        num_markers, _ = self.find_max_panel(compatible_panel, all_marker_names)
+        if num_markers == 0:
+            logger.warning("No possible solution found.")
+            return None
+
+        logger.info(f"--- Searching for solutions with {num_markers} markers ---")
+        solutions = self.iter_solutions(compatible_panel, max_solutions, max_per_combination, time_budget, workers,
+                                        progress_callback, stop_event)
+        found_solutions = self.save_solutions(solutions, output_path or self.get_default_output_path(), keep_results)
+        if not found_solutions:
+            logger.warning("No possible solution found.")
+            return None
+
+        logger.info(f"SUCCESS: Found {len(found_solutions)} solution set(s) for {num_markers} markers.")
+        return found_solutions
+
+    def iter_slot_solutions(self, compatible_panel, time_budget=None, stop_event=None):
+        """
+        Yields `(markers_used, slot_panel)` for every maximum-marker panel at
+        slot level: the antibodies of a marker that share a slot are
+        interchangeable, so they are collapsed into one entry instead of
+        being searched and listed one by one. `slot_panel` has `slots`, one
+        {'marker', 'used_laser', 'detector_name', 'antibodies'} dict per
+        marker, and `num_panels`, the number of full panels it stands for.
+        """
+        deadline = time.monotonic() + time_budget if time_budget is not None else None
+        num_markers, _ = self.find_max_panel(compatible_panel)
+        if num_markers == 0:
+            return
+        compiled = self.compile_panel(compatible_panel)
+        cache = SubproblemCache(self.SUBPROBLEM_CACHE_SIZE) if self.SUBPROBLEM_CACHE_SIZE else None
+        rows = compiled.rows
+
+        start = time.monotonic()
+        num_panels = 0
+        try:
+            for marker_combo in self.iter_marker_combinations(compatible_panel, num_markers, compiled, cache):
+                if stop_event is not None and stop_event.is_set():
+                    return
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+                search = compiled.iter_slot_assignments(
+                    compiled.marker_indices(marker_combo), deadline, stop_event=stop_event, cache=cache, stats=self.stats
                 )
+                try:
+                    for classes in search:
+                        slot_panel = {
+                            'slots': [
+                                {
+                                    'marker': rows[ids[0]]['marker'], 'used_laser': rows[ids[0]]['used_laser'],
+                                    'detector_name': rows[ids[0]]['detector_name'],
+                                    'antibodies': [rows[ab_id]['name'] for ab_id in ids],
+                                }
+                                for ids in classes
+                            ],
+                            'num_panels': math.prod(len(ids) for ids in classes),
+                        }
+                        num_panels += slot_panel['num_panels']
+                        yield marker_combo, slot_panel
+                finally:
+                    search.close()
+        finally:
+            self.stats.add_solutions(num_markers, num_panels)
+            self.stats.add_time('search', time.monotonic() - start)
+        if deadline is not None and time.monotonic() >= deadline:
+            logger.warning(f"Time budget of {time_budget}s exhausted after {num_panels} panel(s).")
 
-                if solutions_for_this_combo:
-                    omitted = set(all_marker_names) - set(marker_combo)
-                    found_solutions.append({
-                        "markers_used": list(marker_combo),
-                        "markers_omitted": list(omitted),
-                        "solutions": solutions_for_this_combo
-                    })
+    def find_slot_solutions(self, compatible_panel, output_path=None, time_budget=None, stop_event=None):
+        """
+        Lists the maximum-marker panels at slot level (see
+        `iter_slot_solutions`) and writes them to `output_path` as CSV. Returns
+        one package per solution set with `slot_panels`, `num_slot_panels`
+        and `num_solutions`, the number of full panels they stand for.
+        """
+        found_solutions = []
+        solutions = self.iter_slot_solutions(compatible_panel, time_budget, stop_event)
+        for markers_used, group in itertools.groupby(solutions, key=lambda item: tuple(item[0])):
+            slot_panels = [slot_panel for _, slot_panel in group]
+            found_solutions.append(self.result_package(
+                markers_used, slot_panels=slot_panels, num_slot_panels=len(slot_panels),
+                num_solutions=sum(slot_panel['num_panels'] for slot_panel in slot_panels)
+            ))
+        if not found_solutions:
+            logger.warning("No possible solution found.")
+            return None
 
-            if found_solutions:
-                print(f"\nSUCCESS: Found solution set(s) for {num_markers} markers.")
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                # Ensure the Desktop directory exists
-                desktop_path = os.path.join(os.path.expanduser('~'), 'Desktop')
-                os.makedirs(desktop_path, exist_ok=True)
-                filename = f"antibody_panels_{timestamp}.csv"
-                self.save_results_to_csv(found_solutions, os.path.join(desktop_path, filename))
-                return found_solutions
+        num_solutions = sum(package['num_solutions'] for package in found_solutions)
+        num_slot_panels = sum(package['num_slot_panels'] for package in found_solutions)
+        logger.info(f"SUCCESS: Found {num_solutions} panel(s) for {len(found_solutions[0]['markers_used'])} markers, "
+                    f"listed as {num_slot_panels} slot-level panel(s).")
+        self.save_slot_panels(found_solutions, output_path or self.get_default_output_path())
+        return found_solutions
 
-        print("No possible solution found.")
-        return None
+    def save_slot_panels(self, results, filename):
+        """Writes `find_slot_solutions` output; slot-level panels are only written as CSV."""
+        if is_columnar_path(filename):
+            raise ValueError(f"Slot-level panels can only be saved as CSV, not {filename}")
+        with self.stats.phase('write'):
+            write_slot_panels_csv(filename, results)
+        logger.info(f"Results successfully saved to {filename}")
 
+    def find_top_panels(self, compatible_panel, top_k=100, max_solutions=None, max_per_combination=None, time_budget=None,
+                        workers=None, progress_callback=None, stop_event=None):
+        """
+        Searches every panel that uses the maximum number of markers, scores
+        them by total spillover in vectorised batches and keeps only the
+        `top_k` best in a heap. Returns packages sorted best first, each with
+        `markers_used`, `markers_omitted`, `panel` and `score`.
+        """
+        if top_k < 1:
+            raise ValueError(f"top_k must be at least 1, not {top_k}")
+        compiled = self.compile_panel(compatible_panel)
+        # Spectral overlap of every candidate with every slot, computed once per run
+        spillover = SpilloverMatrix(compiled, self.instrument_config)
+        top_panels = TopPanels(top_k)
 
+        assignments = self.iter_solution_assignments(
+            compiled, compatible_panel, max_solutions, max_per_combination, time_budget, workers,
+            progress_callback, stop_event
+        )
+        while True:
+            batch = list(itertools.islice(assignments, self.SCORE_BATCH_SIZE))
+            if not batch:
+                break
+            scores = spillover.score_many([assignment for _, assignment in batch])
+            for (marker_combo, assignment), score in zip(batch, scores):
+                top_panels.push(float(score), (marker_combo, assignment))
 
-    def run(self):
-        """Runs the entire analysis process."""
-        compatible_panel = self.prepare_and_filter_panel()
-        if compatible_panel:
-            self.find_best_solution(compatible_panel)
+        ranked = []
+        for score, (marker_combo, assignment) in top_panels.best():
+            ranked.append(self.result_package(marker_combo, panel=compiled.build_panel(assignment), score=score))
+        logger.info(f"Scored {top_panels.seen} panel(s) by spillover, kept the best {len(ranked)}.")
+        return ranked
+
+    def find_optimal_panel(self, compatible_panel, cost_key=None, spillover_weight=1.0, time_budget=None, stop_event=None):
+        """
+        Branch-and-bound search for the single cheapest panel that uses the
+        maximum number of markers, without enumerating every solution. A
+        panel costs `spillover_weight` times its spillover score plus, with
+        `cost_key`, the sum of that antibody field (e.g. 'price'). The best
+        cost found so far is shared across marker combinations, so most of
+        them are pruned at the root.
+
+        The search is anytime: it starts from the matching witness, improved
+        by greedy swaps, and only replaces it with cheaper panels, so a panel
+        is returned however early `time_budget` seconds or `stop_event` end
+        the search. Returns a package like `find_top_panels` results plus
+        `optimal`, which is False when the search was cut short and the panel
+        is only the best found so far.
+        """
+        all_marker_names = list(self.antibody_panel.keys())
+        num_markers, witness = self.find_max_panel(compatible_panel, all_marker_names)
+        if num_markers == 0:
+            logger.warning("No possible solution found.")
+            return None
+
+        compiled = self.compile_panel(compatible_panel)
+        unary = [float(row.get(cost_key, 0) or 0) if cost_key else 0.0 for row in compiled.rows]
+        cross = SpilloverMatrix(compiled, self.instrument_config).relative_matrix() * spillover_weight
+        solver = BranchAndBound(compiled, unary, cross)
+        deadline = time.monotonic() + time_budget if time_budget is not None else None
+
+        seed_combo = tuple(ab['marker'] for ab in witness)
+        best_cost, seed = solver.improve(
+            compiled.marker_indices(seed_combo), compiled.assignment_for(witness), deadline
+        )
+        best = (seed_combo, seed)
+        optimal = True
+        cache = SubproblemCache(self.SUBPROBLEM_CACHE_SIZE)
+        with self.stats.phase('search'):
+            for marker_combo in self.iter_marker_combinations(compatible_panel, num_markers, compiled, cache):
+                cost, assignment, complete = solver.solve(
+                    compiled.marker_indices(marker_combo), best_cost, deadline, stop_event
+                )
+                if assignment is not None:
+                    best_cost, best = cost, (marker_combo, assignment)
+                if not complete:
+                    optimal = False
+                    break
+
+        logger.info(f"Branch and bound visited {solver.nodes} node(s) and pruned {solver.pruned}.")
+        self.stats.nodes += solver.nodes
+        self.stats.pruned += solver.pruned
+        if not optimal:
+            logger.warning("Search stopped early; returning the best panel found so far (not proven optimal).")
+        marker_combo, assignment = best
+        return self.result_package(
+            marker_combo, panel=compiled.build_panel(assignment), score=best_cost, optimal=optimal
+        )
+
+    def save_ranked_panels(self, ranked, filename):
+        """Writes `find_top_panels` output; Panel_ID is the rank and panels sharing markers share a Solution_Set_ID."""
+        if not ranked:
+            logger.warning("No results to save.")
+            return
+
+        set_ids = {}
+        with open_result_writer(filename, with_score=True) as writer:
+            for rank, package in enumerate(ranked, 1):
+                set_id = set_ids.setdefault(tuple(package['markers_used']), len(set_ids) + 1)
+                writer.write_panel(
+                    set_id, rank, ', '.join(package['markers_used']), ', '.join(package['markers_omitted']),
+                    package['panel'], package['score']
+                )
+        logger.info(f"Results successfully saved to {filename}")
+
+    def find_witness_solution(self, compatible_panel):
+        """Returns the maximum-marker witness panel packaged like `find_best_solution` results."""
+        all_marker_names = list(self.antibody_panel.keys())
+        num_markers, witness = self.find_max_panel(compatible_panel, all_marker_names)
+        if num_markers == 0:
+            logger.warning("No possible solution found.")
+            return None
+
+        logger.info(f"SUCCESS: At most {num_markers} markers fit on the instrument.")
+        markers_used = [ab['marker'] for ab in witness]
+        return [self.result_package(markers_used, solutions=[witness], num_solutions=1)]
+
+    def run(self, enumerate_all=False, workers=None, output_path=None, top_k=None, optimize=False, stats_path=None,
+            time_budget=None, use_cache=True, expand=True, keep_results=True):
+        """
+        Runs the entire analysis process. By default only the maximum marker
+        count and one witness panel are computed; pass `enumerate_all=True`
+        to list every panel of that size, optionally on `workers` processes.
+        With `top_k`, only the `top_k` panels with the least spillover are
+        kept instead. With `optimize`, branch and bound finds the single
+        panel with the least spillover directly; `time_budget` (seconds)
+        turns it into an anytime search that returns the best panel found
+        by then, flagged `optimal` only if it was proven. Results go to
+        `output_path` (.csv, .parquet or .feather). Solver statistics are
+        logged at the end and also written as JSON to `stats_path` when given.
+        With `expand=False`, an enumeration lists slot-level panels instead,
+        where antibodies of a marker that share a slot are given together on
+        one row (CSV only). With `keep_results=False`, a full enumeration
+        only writes its panels to `output_path` and returns the counts.
+
+        Results are kept in an on-disk cache keyed by a fingerprint of the
+        panel, the instrument and the mode. When nothing changed they are
+        returned without searching; with no `output_path`, the result file
+        of the earlier run is reused if it still exists. Enumerations of more
+        than RESULT_CACHE_MAX_PANELS panels (or run with `keep_results=False`)
+        are only cached as counts plus their result file, so they are reused
+        by `keep_results=False` runs while that file is unchanged and
+        searched again otherwise. `use_cache=False` always runs the search.
+        """
+        if enumerate_all and not expand and not top_k and not optimize and output_path is not None:
+            # Checked up front so a long slot-level search is not wasted
+            if is_columnar_path(output_path):
+                raise ValueError(f"Slot-level panels can only be saved as CSV, not {output_path}")
+        self.stats = SolverStats()
+        result_cache = self.open_result_cache() if use_cache else None
+        try:
+            if result_cache is None:
+                return self.run_analysis(
+                    enumerate_all, workers, output_path, top_k, optimize, time_budget, expand, keep_results
+                )
+
+            if optimize:
+                mode = 'optimal'
+            elif enumerate_all:
+                mode = 'top' if top_k else ('all' if expand else 'slots')
+            else:
+                mode = 'witness'
+            key = fingerprint(self.antibody_panel, self.instrument_config, {
+                'mode': mode, 'top_k': top_k if mode == 'top' else None,
+                'excitation_tolerance': self.excitation_tolerance,
+            })
+            cached = result_cache.get(key)
+            if cached is not None:
+                results = self.reuse_cached_results(result_cache, key, *cached, output_path, mode, keep_results)
+                if results is not None:
+                    return results
+
+            output_path = output_path or self.get_default_output_path()
+            results = self.run_analysis(
+                enumerate_all, workers, output_path, top_k, optimize, time_budget, expand, keep_results
+            )
+            # A panel cut short by the time budget may not be the final answer
+            if results and all(package.get('optimal', True) for package in results):
+                self.cache_results(result_cache, key, results, output_path, mode, keep_results)
+            return results
+        finally:
+            if result_cache is not None:
+                result_cache.close()
+            for line in self.stats.summary_lines():
+                logger.info(line)
+            if stats_path is not None:
+                self.stats.to_json(stats_path)
+
+    def open_result_cache(self):
+        """Opens the on-disk result cache, or returns None when it is disabled or cannot be used."""
+        if not self.RESULT_CACHE_PATH:
+            return None
+        try:
+            return ResultCache(self.RESULT_CACHE_PATH, self.RESULT_CACHE_MAX_BYTES)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Result cache {self.RESULT_CACHE_PATH} is unavailable ({e}); running without it.")
+            return None
+
+    def cache_results(self, result_cache, key, results, output_path, mode, keep_results):
+        """
+        Stores results in the cache. Large enumerations are stored without
+        their panels, so encoding them never costs as much as the panels.
+        """
+        file_only = False
+        if mode in ('all', 'slots'):
+            listed = 'slot_panels' if mode == 'slots' else 'solutions'
+            count = sum(package['num_slot_panels' if mode == 'slots' else 'num_solutions'] for package in results)
+            if (mode == 'all' and not keep_results) or count > self.RESULT_CACHE_MAX_PANELS:
+                results = [{**package, listed: []} for package in results]
+                file_only = True
+        try:
+            result_cache.put(key, results, output_path, file_only)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not store the results in the cache ({e}).")
+
+    def reuse_cached_results(self, result_cache, key, results, cached_path, file_only, output_path, mode,
+                             keep_results=True):
+        """
+        Returns cached results. Without `output_path` the earlier result file
+        is reused when it is unchanged; otherwise it is copied to
+        `output_path`, or the results are written out again. Returns None
+        when a `file_only` entry cannot serve the run, which then searches.
+        """
+        reusable = cached_path is not None
+        if file_only and (keep_results or (
+                output_path is not None
+                and os.path.splitext(cached_path)[1].lower() != os.path.splitext(output_path)[1].lower())):
+            return None
+        if output_path is None and reusable:
+            logger.info(f"Panel and instrument unchanged; the results are in {cached_path}")
+            return results
+        logger.info("Panel and instrument unchanged; using cached results.")
+        output_path = output_path or self.get_default_output_path()
+        if reusable and os.path.splitext(cached_path)[1].lower() == os.path.splitext(output_path)[1].lower():
+            if os.path.abspath(cached_path) != os.path.abspath(output_path):
+                shutil.copyfile(cached_path, output_path)
+            logger.info(f"Results successfully saved to {output_path}")
+        elif mode in ('optimal', 'top'):
+            self.save_ranked_panels(results, output_path)
+        elif mode == 'slots':
+            self.save_slot_panels(results, output_path)
         else:
-            print("No antibodies were compatible with the instrument.")
+            self.save_results_to_csv(results, output_path)
+        result_cache.set_output_path(key, output_path)
+        return results
+
+    def run_analysis(self, enumerate_all, workers, output_path, top_k, optimize, time_budget, expand=True,
+                     keep_results=True):
+        compatible_panel = self.prepare_and_filter_panel()
+        if not compatible_panel:
+            logger.warning("No antibodies were compatible with the instrument.")
+            return None
+
+        if optimize:
+            best = self.find_optimal_panel(compatible_panel, time_budget=time_budget)
+            ranked = [best] if best else []
+            self.save_ranked_panels(ranked, output_path or self.get_default_output_path())
+            return ranked
+        if enumerate_all and top_k:
+            ranked = self.find_top_panels(compatible_panel, top_k, workers=workers)
+            self.save_ranked_panels(ranked, output_path or self.get_default_output_path())
+            return ranked
+        if enumerate_all and not expand:
+            return self.find_slot_solutions(compatible_panel, output_path=output_path)
+        if enumerate_all:
+            return self.find_best_solution(
+                compatible_panel, workers=workers, output_path=output_path, keep_results=keep_results
+            )
+
+        results = self.find_witness_solution(compatible_panel)
+        if results:
+            self.save_results_to_csv(results, output_path or self.get_default_output_path())
+        return results
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     wizard = Wizard(ANTIBODY_PANEL, INSTRUMENT_CONFIG)
 
     wizard.run()
\ No newline at end of file
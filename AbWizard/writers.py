@@ -0,0 +1,167 @@
+import csv
+import os
+import time
+
+HEADERS = ['Solution_Set_ID','Panel_ID','Markers_Used','Markers_Omitted','Marker','Antibody_Name','Excitation_Laser (nm)','Emission_Wavelength (nm)','Detector']
+# Extra column written for ranked panels
+SCORE_HEADER = 'Spillover_Score'
+
+# File extensions written in a columnar format by `open_result_writer`;
+# any other name (including .csv, .txt or none) gets CSV
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+FEATHER_EXTENSIONS = ('.feather', '.arrow')
+
+
+# ------------------------------------------------------------------- #
+# Streaming result writers
+# ------------------------------------------------------------------- #
+class ResultWriter:
+    """
+    Base class for writers that consume panels one at a time and flush them
+    to disk in row batches, so result sets never have to fit in memory.
+    Use as a context manager, or call `close()` when done. With `with_score`
+    every row also carries the panel's spillover score.
+    """
+
+    def __init__(self, filename, batch_size=50000, with_score=False):
+        self.filename = filename
+        self.batch_size = batch_size
+        self.with_score = with_score
+        self.headers = HEADERS + [SCORE_HEADER] if with_score else HEADERS
+        self.batch = []
+        self.rows_written = 0
+        self.panels_written = 0
+        # Time spent in write_batch, for SolverStats
+        self.write_seconds = 0.0
+
+    def write_panel(self, set_id, panel_id, markers_used, markers_omitted, panel, score=None):
+        """Buffers one row per antibody of `panel`; marker lists are pre-joined strings."""
+        for antibody in panel:
+            row = (
+                set_id, panel_id, markers_used, markers_omitted,
+                antibody['marker'], antibody['name'],
+                antibody['used_laser'], antibody['em'], antibody['detector_name'],
+            )
+            self.batch.append(row + (score,) if self.with_score else row)
+        self.panels_written += 1
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.batch:
+            start = time.perf_counter()
+            self.write_batch(self.batch)
+            self.write_seconds += time.perf_counter() - start
+            self.rows_written += len(self.batch)
+            self.batch = []
+
+    def write_batch(self, rows):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class CsvResultWriter(ResultWriter):
+    def __init__(self, filename, batch_size=50000, with_score=False):
+        super().__init__(filename, batch_size, with_score)
+        self.csvfile = open(filename, 'w', newline='')
+        self.writer = csv.writer(self.csvfile)
+        self.writer.writerow(self.headers)
+
+    def write_batch(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        super().close()
+        self.csvfile.close()
+
+
+class ColumnarResultWriter(ResultWriter):
+    """
+    Writes Parquet (one row group per batch) or Feather/Arrow IPC files, which
+    downstream notebooks can memory-map. Batches go through pandas and need
+    pyarrow installed.
+    """
+
+    def __init__(self, filename, file_format, batch_size=50000, with_score=False):
+        super().__init__(filename, batch_size, with_score)
+        try:
+            import pandas as pd
+            import pyarrow as pa
+        except ImportError as e:
+            raise ImportError(f"Writing {file_format} results needs pandas and pyarrow ({e}).") from e
+        self.pd = pd
+        self.pa = pa
+        self.schema = pa.schema([
+            ('Solution_Set_ID', pa.int64()), ('Panel_ID', pa.int64()),
+            ('Markers_Used', pa.string()), ('Markers_Omitted', pa.string()),
+            ('Marker', pa.string()), ('Antibody_Name', pa.string()),
+            ('Excitation_Laser (nm)', pa.float64()), ('Emission_Wavelength (nm)', pa.float64()),
+            ('Detector', pa.string()),
+        ] + ([(SCORE_HEADER, pa.float64())] if with_score else []))
+        if file_format == 'parquet':
+            import pyarrow.parquet as pq
+            self.writer = pq.ParquetWriter(filename, self.schema)
+        else:
+            import pyarrow.ipc as ipc
+            self.sink = pa.OSFile(filename, 'wb')
+            self.writer = ipc.new_file(self.sink, self.schema)
+
+    def write_batch(self, rows):
+        frame = self.pd.DataFrame.from_records(rows, columns=self.headers)
+        table = self.pa.Table.from_pandas(frame, schema=self.schema, preserve_index=False)
+        self.writer.write_table(table)
+
+    def close(self):
+        super().close()
+        self.writer.close()
+        if hasattr(self, 'sink'):
+            self.sink.close()
+
+
+def is_columnar_path(filename):
+    extension = os.path.splitext(filename)[1].lower()
+    return extension in PARQUET_EXTENSIONS or extension in FEATHER_EXTENSIONS
+
+
+def open_result_writer(filename, batch_size=50000, with_score=False):
+    """Picks a Parquet or Feather writer from the file extension, and CSV for anything else."""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in PARQUET_EXTENSIONS:
+        return ColumnarResultWriter(filename, 'parquet', batch_size, with_score)
+    if extension in FEATHER_EXTENSIONS:
+        return ColumnarResultWriter(filename, 'feather', batch_size, with_score)
+    return CsvResultWriter(filename, batch_size, with_score)
+
+
+# ------------------------------------------------------------------- #
+# Slot-level panels
+# ------------------------------------------------------------------- #
+# One row per marker of a slot-level panel; its interchangeable antibodies
+# share the row and Panels is how many full panels the slot panel stands for
+SLOT_PANEL_HEADERS = ['Solution_Set_ID', 'Slot_Panel_ID', 'Markers_Used', 'Markers_Omitted', 'Marker', 'Antibody_Names',
+                      'Excitation_Laser (nm)', 'Detector', 'Panels']
+
+
+def write_slot_panels_csv(filename, packages):
+    """Writes `Wizard.find_slot_solutions` output as CSV."""
+    with open(filename, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(SLOT_PANEL_HEADERS)
+        for set_id, package in enumerate(packages, 1):
+            markers_used = ', '.join(package['markers_used'])
+            markers_omitted = ', '.join(package['markers_omitted'])
+            for panel_id, slot_panel in enumerate(package['slot_panels'], 1):
+                for entry in slot_panel['slots']:
+                    writer.writerow([
+                        set_id, panel_id, markers_used, markers_omitted, entry['marker'],
+                        ' | '.join(entry['antibodies']), entry['used_laser'], entry['detector_name'],
+                        slot_panel['num_panels'],
+                    ])
@@ -0,0 +1,49 @@
+# -*- mode: python ; coding: utf-8 -*-
+# Lean PyInstaller profile for the GUI:
+#
+#     pip install -r requirements-build.txt
+#     pyinstaller abwizard.spec
+#
+# Builds a one-folder bundle in dist/AbWizard. A one-file bundle unpacks
+# itself to a temporary directory on every launch, which is most of its
+# start-up time, and UPX-compressed libraries are decompressed on every
+# launch too, so neither is used.
+
+EXCLUDES = [
+    # Only needed for Parquet / Feather output, which the GUI does not offer
+    'pandas', 'pyarrow',
+    # Present in many environments but never imported by AbWizard
+    'tkinter', 'matplotlib', 'scipy', 'IPython', 'PIL', 'pytest', 'setuptools',
+    'numpy.distutils', 'numpy.f2py',
+    # Qt modules beyond QtCore, QtGui and QtWidgets
+    'PySide6.QtNetwork', 'PySide6.QtQml', 'PySide6.QtQuick', 'PySide6.QtQuickWidgets',
+    'PySide6.QtWebEngineCore', 'PySide6.QtWebEngineWidgets', 'PySide6.QtMultimedia',
+    'PySide6.QtOpenGL', 'PySide6.QtOpenGLWidgets', 'PySide6.QtSql', 'PySide6.QtSvg',
+    'PySide6.QtPrintSupport', 'PySide6.Qt3DCore', 'PySide6.QtCharts', 'PySide6.QtDataVisualization',
+]
+
+a = Analysis(
+    ['AbWizard/gui.py'],
+    pathex=['AbWizard'],
+    # Imported inside functions so they load on first use, not at start-up
+    hiddenimports=['session', 'wizard'],
+    excludes=EXCLUDES,
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='AbWizard',
+    console=False,
+    upx=False,
+)
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    upx=False,
+    name='AbWizard',
+)
@@ -0,0 +1,76 @@
+"""
+Checks how quickly the GUI comes up: times a fresh interpreter from launch
+to the first shown main window, and fails when that is over the limit or
+when the solver stack was imported before the first run.
+
+    python benchmarks/bench_startup.py --max-seconds 2
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+GUI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'AbWizard')
+# Modules the window must not need before Run is pressed or the panel is edited
+DEFERRED_MODULES = ('numpy', 'pandas', 'pyarrow', 'wizard', 'session', 'solver', 'spillover')
+
+# Runs in the child interpreter; prints its timings as JSON
+PROBE = f"""
+import json, sys, time
+start = time.perf_counter()
+from PySide6.QtWidgets import QApplication
+import gui
+imported = time.perf_counter()
+app = QApplication(sys.argv)
+window = gui.MainWindow()
+window.show()
+app.processEvents()
+shown = time.perf_counter()
+print(json.dumps({{
+    'import_seconds': imported - start,
+    'window_seconds': shown - imported,
+    'loaded': [name for name in {DEFERRED_MODULES!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure_startup():
+    env = dict(os.environ)
+    # No display is needed for the check
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE], cwd=GUI_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    total = time.perf_counter() - start
+    result = json.loads(output.strip().splitlines()[-1])
+    # Includes interpreter start-up and shutdown, as a user would see it
+    result['total_seconds'] = total
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3, help="launches to time; the fastest one counts")
+    parser.add_argument('--max-seconds', type=float, default=2.0, help="fail when launch to window takes longer")
+    args = parser.parse_args()
+
+    runs = [measure_startup() for _ in range(args.runs)]
+    best = min(runs, key=lambda run: run['total_seconds'])
+    print(f"imports {best['import_seconds']:.3f}s, window {best['window_seconds']:.3f}s, "
+          f"total {best['total_seconds']:.3f}s (best of {args.runs})")
+
+    failures = []
+    if best['loaded']:
+        failures.append(f"imported at startup: {', '.join(best['loaded'])}")
+    if best['total_seconds'] > args.max_seconds:
+        failures.append(f"startup took {best['total_seconds']:.3f}s, over the {args.max_seconds}s limit")
+    if failures:
+        sys.exit('; '.join(failures))
+    print("Startup check passed.")
+
+
+if __name__ == '__main__':
+    main()
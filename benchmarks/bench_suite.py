@@ -0,0 +1,166 @@
+"""
+Times filtering, search and CSV writing over a grid of synthetic problems
+and records wall time and peak traced memory per stage as JSON.
+
+    python benchmarks/bench_suite.py --output results.json
+    python benchmarks/bench_suite.py --grid small --compare results.json
+"""
+import argparse
+import gc
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'AbWizard'))
+
+from generators import make_instrument, make_panel
+from wizard import Wizard
+
+# (lasers, detectors, markers, antibodies per marker) cases per grid
+GRIDS = {
+    'small': {'lasers': [2, 3], 'detectors': [4], 'markers': [6, 8], 'antibodies': [3]},
+    'default': {'lasers': [2, 4], 'detectors': [4, 6], 'markers': [8, 12], 'antibodies': [3, 6]},
+    'large': {'lasers': [4, 6], 'detectors': [6, 8], 'markers': [12, 20, 30], 'antibodies': [6, 12]},
+}
+# Stage timings more than this factor slower than the baseline are flagged,
+# unless both runs are too short to time reliably
+REGRESSION_FACTOR = 1.25
+MIN_COMPARED_SECONDS = 0.01
+STAGES = ('filter', 'search', 'write_csv')
+
+
+def measure(function, trace_memory=True):
+    """
+    Returns (result, seconds, peak traced bytes) for `function()`. Tracing
+    slows allocation-heavy code down a lot, so the timing comes from an
+    untraced run and the peak from a second, traced one (None when skipped).
+    """
+    gc.collect()
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    if not trace_memory:
+        return result, seconds, None
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        return result, seconds, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(seed, lasers, detectors, markers, antibodies, off_band, time_budget, max_solutions, trace_memory=True):
+    rng = random.Random(seed)
+    instrument = make_instrument(rng, lasers, detectors)
+    panel = make_panel(rng, instrument, markers, antibodies, off_band)
+    wizard = Wizard(panel, instrument)
+    case = {
+        'seed': seed, 'lasers': lasers, 'detectors': detectors, 'markers': markers, 'antibodies': antibodies,
+        'off_band': off_band,
+    }
+
+    compatible_panel, seconds, peak = measure(wizard.prepare_and_filter_panel, trace_memory)
+    case['filter'] = {'seconds': seconds, 'peak_bytes': peak,
+                      'compatible': sum(len(abs_) for abs_ in compatible_panel.values())}
+
+    def search():
+        solutions = wizard.iter_solutions(compatible_panel, max_solutions=max_solutions, time_budget=time_budget)
+        return sum(1 for _ in solutions)
+    num_panels, seconds, peak = measure(search, trace_memory)
+    case['search'] = {'seconds': seconds, 'peak_bytes': peak, 'panels': num_panels,
+                      'max_markers': wizard.find_max_panel(compatible_panel)[0]}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'panels.csv')
+
+        def write():
+            solutions = wizard.iter_solutions(compatible_panel, max_solutions=max_solutions, time_budget=time_budget)
+            return wizard.save_solutions(solutions, path, keep_results=False)
+        _, seconds, peak = measure(write, trace_memory)
+        case['write_csv'] = {'seconds': seconds, 'peak_bytes': peak,
+                             'file_bytes': os.path.getsize(path) if os.path.exists(path) else 0}
+    return case
+
+
+def case_key(case):
+    return tuple(case[k] for k in ('seed', 'lasers', 'detectors', 'markers', 'antibodies', 'off_band'))
+
+
+def compare(cases, baseline_path):
+    """Prints per-stage time ratios against a previous run; returns the number of regressions."""
+    with open(baseline_path) as f:
+        baseline = {case_key(case): case for case in json.load(f)['cases']}
+    regressions = 0
+    for case in cases:
+        old = baseline.get(case_key(case))
+        if old is None:
+            continue
+        ratios = []
+        for stage in STAGES:
+            ratio = case[stage]['seconds'] / max(old[stage]['seconds'], 1e-9)
+            too_short = max(case[stage]['seconds'], old[stage]['seconds']) < MIN_COMPARED_SECONDS
+            flag = ' !' if ratio > REGRESSION_FACTOR and not too_short else ''
+            regressions += bool(flag)
+            ratios.append(f"{stage} {ratio:.2f}x{flag}")
+        print(f"  L{case['lasers']} D{case['detectors']} M{case['markers']} A{case['antibodies']}: " + ', '.join(ratios))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--grid', choices=sorted(GRIDS), default='default')
+    parser.add_argument('--seeds', type=int, default=1, help="number of seeds per grid point")
+    parser.add_argument('--off-band', type=float, default=0.2, help="fraction of antibodies with random spectra")
+    parser.add_argument('--time-budget', type=float, default=10.0, help="search time limit per case (s)")
+    parser.add_argument('--max-solutions', type=int, default=50000, help="panel cap per case")
+    parser.add_argument('--no-memory', action='store_true', help="skip the traced runs that measure peak memory")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    grid = GRIDS[args.grid]
+    cases = []
+    for seed, lasers, detectors, markers, antibodies in itertools.product(
+            range(args.seeds), grid['lasers'], grid['detectors'], grid['markers'], grid['antibodies']):
+        case = run_case(
+            seed, lasers, detectors, markers, antibodies, args.off_band, args.time_budget, args.max_solutions,
+            not args.no_memory
+        )
+        cases.append(case)
+        print(f"L{lasers} D{detectors} M{markers} A{antibodies} seed {seed}: "
+              f"filter {case['filter']['seconds']:.3f}s, "
+              f"search {case['search']['seconds']:.3f}s ({case['search']['panels']} panels), "
+              f"csv {case['write_csv']['seconds']:.3f}s"
+              + ('' if args.no_memory else f", peak {max(case[s]['peak_bytes'] for s in STAGES) / 2**20:.1f} MiB"))
+
+    if args.output:
+        report = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'grid': args.grid,
+            'settings': {'off_band': args.off_band, 'time_budget': args.time_budget, 'max_solutions': args.max_solutions},
+            'cases': cases,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+    if args.compare:
+        print(f"Compared with {args.compare} (time ratio, new / old):")
+        regressions = compare(cases, args.compare)
+        if regressions:
+            sys.exit(f"{regressions} stage timing(s) regressed by more than {REGRESSION_FACTOR}x")
+
+
+if __name__ == '__main__':
+    main()
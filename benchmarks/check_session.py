@@ -0,0 +1,132 @@
+"""
+Checks that the incremental SolverSession stays exact: applies seeded random
+edits of every kind and, after each one, compares the session's maximum
+marker count and witness against a session rebuilt from scratch.
+
+    python benchmarks/check_session.py --edits 2000
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'AbWizard'))
+
+from generators import make_instrument, make_panel
+from session import SolverSession
+
+EDITS = ('antibody_added', 'antibody_removed', 'marker_added', 'marker_removed', 'laser_added', 'laser_removed',
+         'detector_added', 'detector_removed', 'excitation_tolerance_changed')
+
+
+def random_antibody(rng, instrument, name):
+    lasers = instrument['lasers']
+    if not lasers or rng.random() < 0.2:
+        return {'name': name, 'ex': rng.randint(350, 800), 'em': rng.randint(400, 850)}
+    laser = rng.choice(list(lasers))
+    if not lasers[laser]:
+        return {'name': name, 'ex': laser, 'em': rng.randint(400, 850)}
+    detector = rng.choice(list(lasers[laser].values()))
+    return {'name': name, 'ex': laser + rng.randint(-5, 5), 'em': detector['center']}
+
+
+def apply_edit(rng, session, edit, counter):
+    """Edits the session's data in place and reports it; returns False when the edit does not apply."""
+    panel, lasers = session.antibody_panel, session.instrument_config['lasers']
+    name = f"E{counter}"
+    if edit == 'antibody_added' and panel:
+        marker = rng.choice(list(panel))
+        antibody = random_antibody(rng, session.instrument_config, name)
+        panel[marker].append(antibody)
+        session.antibody_added(marker, antibody)
+    elif edit == 'antibody_removed' and any(panel.values()):
+        marker = rng.choice([m for m in panel if panel[m]])
+        antibody = panel[marker].pop(rng.randrange(len(panel[marker])))
+        session.antibody_removed(marker, antibody)
+    elif edit == 'marker_added':
+        panel[name] = [random_antibody(rng, session.instrument_config, f"{name}-{i}") for i in range(rng.randint(0, 3))]
+        session.marker_added(name)
+    elif edit == 'marker_removed' and panel:
+        marker = rng.choice(list(panel))
+        del panel[marker]
+        session.marker_removed(marker)
+    elif edit == 'laser_added':
+        laser = rng.choice(range(350, 800, 15))
+        if laser in lasers:
+            return False
+        lasers[laser] = {}
+        session.laser_changed(laser)
+    elif edit == 'laser_removed' and lasers:
+        laser = rng.choice(list(lasers))
+        del lasers[laser]
+        session.laser_changed(laser)
+    elif edit == 'detector_added' and lasers:
+        laser = rng.choice(list(lasers))
+        center = rng.randrange(laser + 20, laser + 400, 10)
+        lasers[laser][f"{center}/{name}"] = {'center': center, 'width': rng.choice([10, 20, 30])}
+        session.laser_changed(laser)
+    elif edit == 'detector_removed' and any(lasers.values()):
+        laser = rng.choice([l for l in lasers if lasers[l]])
+        del lasers[laser][rng.choice(list(lasers[laser]))]
+        session.laser_changed(laser)
+    elif edit == 'excitation_tolerance_changed':
+        session.excitation_tolerance_changed(rng.choice([0, 5, 10, 20]))
+    else:
+        return False
+    return True
+
+
+def check_witness(session):
+    """The witness must use distinct slots, one antibody per marker, and be as large as the count."""
+    witness = session.witness()
+    slots = {(ab['used_laser'], ab['detector_name']) for ab in witness}
+    markers = {ab['marker'] for ab in witness}
+    return len(witness) == len(slots) == len(markers) == session.max_markers()
+
+
+def check_against_rebuild(session, label):
+    fresh = SolverSession(session.antibody_panel, session.instrument_config, session.wizard.excitation_tolerance)
+    if session.max_markers() != fresh.max_markers() or not check_witness(session):
+        sys.exit(f"ERROR: after {label} the session reports {session.max_markers()} markers, "
+                 f"a rebuilt session {fresh.max_markers()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--edits', type=int, default=2000)
+    parser.add_argument('--lasers', type=int, default=2)
+    parser.add_argument('--detectors', type=int, default=3)
+    parser.add_argument('--markers', type=int, default=5)
+    parser.add_argument('--antibodies', type=int, default=2)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    # A matched marker gaining a second slot frees its first slot for an unmatched marker
+    instrument = {'lasers': {488: {'A': {'center': 520, 'width': 20}, 'B': {'center': 580, 'width': 20}}}}
+    session = SolverSession({'M1': [{'name': 'a', 'ex': 488, 'em': 520}], 'M2': [{'name': 'b', 'ex': 488, 'em': 520}]},
+                            instrument)
+    antibody = {'name': 'c', 'ex': 488, 'em': 580}
+    session.antibody_panel['M1'].append(antibody)
+    session.antibody_added('M1', antibody)
+    check_against_rebuild(session, 'antibody_added on a matched marker')
+
+    # Few slots for the markers, so most edits change which markers fit
+    rng = random.Random(args.seed)
+    instrument = make_instrument(rng, args.lasers, args.detectors)
+    session = SolverSession(make_panel(rng, instrument, args.markers, args.antibodies), instrument)
+    applied = {edit: 0 for edit in EDITS}
+    for counter in range(args.edits):
+        edit = rng.choice(EDITS)
+        if not apply_edit(rng, session, edit, counter):
+            continue
+        applied[edit] += 1
+        check_against_rebuild(session, f"edit {counter} ({edit})")
+
+    print(', '.join(f"{edit} x{count}" for edit, count in applied.items()))
+    print("Session matched a fresh rebuild after every edit.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+"""
+Seeded synthetic instruments and antibody panels shared by the benchmarks.
+Every antibody is placed inside some detector band of an existing laser, so
+the generated panels are dense enough to exercise the search.
+"""
+
+
+def make_instrument(rng, num_lasers, num_detectors):
+    lasers = {}
+    for laser in rng.sample(range(350, 800, 15), num_lasers):
+        detectors = {}
+        for center in sorted(rng.sample(range(laser + 20, laser + 400, 30), num_detectors)):
+            width = rng.choice([10, 20, 30])
+            detectors[f"{center}/{width}"] = {'center': center, 'width': width}
+        lasers[laser] = detectors
+    return {'lasers': lasers}
+
+
+def make_panel(rng, instrument, num_markers, num_antibodies, off_band=0.0):
+    """`off_band` is the fraction of antibodies given random spectra, most of which get filtered out."""
+    lasers = instrument['lasers']
+    panel = {}
+    for m in range(num_markers):
+        antibodies = []
+        for a in range(num_antibodies):
+            if off_band and rng.random() < off_band:
+                antibodies.append({'name': f"M{m}-Ab{a}", 'ex': rng.randint(350, 800), 'em': rng.randint(400, 850)})
+                continue
+            laser = rng.choice(list(lasers))
+            detector = rng.choice(list(lasers[laser].values()))
+            em = detector['center'] + rng.randint(-detector['width'] // 2, detector['width'] // 2 - 1)
+            antibodies.append({'name': f"M{m}-Ab{a}", 'ex': laser + rng.randint(-5, 5), 'em': em})
+        panel[f"Marker{m}"] = antibodies
+    return panel